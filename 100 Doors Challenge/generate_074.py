@@ -0,0 +1,113 @@
+"""
+Random hexagonal boards for level 074 (--level and --batch files)
+
+A hexagon with --sizes cells per side is laid out like initial_board:
+rows alternate between odd (full) and even (one invisible B at the end)
+rows and the middle row is odd, so the even_steps/odd_steps of
+level_074 apply. The board starts undecided; the agent is put on a
+random cell and slides in random directions over undecided cells,
+stopping either at the edge, at a cell it already passed or at an
+undecided cell which is made a block (X). The walk ends when the agent
+cannot move, the cells it passed are the playable cells and the rest
+become blocks, so the walk is a planted solution. Of --attempts walks
+the one leaving the most playable cells is kept. Files are written as OUT/<size>_<seed> with the
+planted moves in a comment line.
+
+  python generate_074.py levels --sizes 4 5 6 --seeds 3
+  python level_074.py --batch levels --prune
+"""
+
+import argparse
+import os
+import random
+
+from level_074 import directions, even_steps, odd_steps
+
+
+def hexagon(size: int) -> list:
+    """Rows of the board, True for the cells of the hexagon"""
+    width = 2 * size - 1
+    # leading invisible rows keep the middle row odd
+    lead = 1 if size % 2 == 1 else 2
+    middle = lead + size - 1
+    rows = [[False] * width for _ in range(lead)]
+    for r in range(lead, middle + size):
+        d = abs(r - middle)
+        first = d // 2
+        last = width - 1 - (d + 1) // 2
+        rows.append([first <= c <= last for c in range(width)])
+    return rows
+
+
+def walk(cells: list, rnd: random.Random) -> list:
+    """Plant a walk in cells (None undecided, 'X', 'O', 'V'), return its moves"""
+    height, width = len(cells), len(cells[0])
+    options = [(r, c) for r in range(height) for c in range(width) if cells[r][c] is None]
+    r, c = rnd.choice(options)
+    cells[r][c] = 'V'
+    moves = []
+    while True:
+        rays = []
+        for d, drc in enumerate(directions):
+            ray = []
+            pr, pc = r, c
+            while True:
+                dr, dc = even_steps[drc] if pr % 2 == 0 else odd_steps[drc]
+                pr, pc = pr + dr, pc + dc
+                if not (0 <= pr < height and 0 <= pc < width) or cells[pr][pc] is not None:
+                    break
+                ray.append((pr, pc))
+            if ray:
+                rays.append((d, ray))
+        if not rays:
+            return moves
+        d, ray = rnd.choice(rays)
+        # mostly run to the end of the ray, else stop early at a new block
+        length = len(ray) if rnd.random() < 0.7 else rnd.randint(1, len(ray))
+        for pr, pc in ray[:length]:
+            cells[pr][pc] = 'O'
+        if length < len(ray):
+            br, bc = ray[length]
+            cells[br][bc] = 'X'
+        r, c = ray[length - 1]
+        moves.append(directions[d])
+
+
+def generate(size: int, seed: int, attempts: int=50) -> str:
+    rnd = random.Random(seed * 1_000_003 + size)
+    shape = hexagon(size)
+    best = None
+    for _ in range(attempts):
+        cells = [[None if inside else 'B' for inside in row] for row in shape]
+        moves = walk(cells, rnd)
+        playable = sum(row.count('O') for row in cells)
+        if best is None or playable > best[0]:
+            best = (playable, cells, moves)
+    _, cells, moves = best
+    lines = [f'# hex side {size}, seed {seed}, planted: {" ".join(moves)}']
+    for row in cells:
+        lines.append(' '.join('X' if cell is None else cell for cell in row))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out_dir')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 5, 6],
+                        help='cells per side of the hexagon')
+    parser.add_argument('--seeds', type=int, default=1, help='boards per size')
+    parser.add_argument('--seed', type=int, default=0, help='first seed')
+    parser.add_argument('--attempts', type=int, default=50,
+                        help='walks tried per board, the one with most playable cells is kept')
+    args = parser.parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    for size in args.sizes:
+        for seed in range(args.seed, args.seed + args.seeds):
+            path = os.path.join(args.out_dir, f'{size}_{seed}')
+            with open(path, 'w') as f:
+                f.write(generate(size, seed, args.attempts))
+            print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Toggle puzzles (like level 045) as linear system over GF(2)
+
+Pressing a button twice does nothing and the order of presses does not
+matter, so a solution is just a set of buttons. Each button is a column
+vector of lamps it toggles and we need to find x such that
+A x = target - start (mod 2), where target is all lamps on.
+
+The toggle matrix uses the same shape as lamps_step in level_045:
+a dict from button number to list of lamp numbers (both start from 1).
+Every row of the matrix is stored as Python int, bit k is button k+1
+and bit n_buttons is the right hand side, so a row operation is a XOR.
+
+Solution and null space vectors are returned as int bitmasks over the
+buttons, use to_buttons to convert it into list of button numbers.
+"""
+
+import argparse
+import time
+
+
+class ToggleSystem:
+    def __init__(self, steps: dict, n_lamps: int=None):
+        self.buttons = sorted(steps)
+        if n_lamps is None:
+            n_lamps = max(max(lamps) for lamps in steps.values())
+        self.n_lamps = n_lamps
+        self.columns = []
+        for button in self.buttons:
+            col = 0
+            for lamp in steps[button]:
+                col |= 1 << (lamp - 1)
+            self.columns.append(col)
+
+    def solve(self, start_lamps: list) -> tuple:
+        """
+        Return (particular, null_space) or None if no solution exists.
+        Every solution is particular XOR some combination of null_space.
+        """
+        n = len(self.buttons)
+        rhs_bit = 1 << n
+        start = 0
+        for lamp in start_lamps:
+            start |= 1 << (lamp - 1)
+        rows = []
+        for lamp in range(self.n_lamps):
+            row = 0
+            for k, col in enumerate(self.columns):
+                if col >> lamp & 1:
+                    row |= 1 << k
+            if not start >> lamp & 1:
+                row |= rhs_bit
+            rows.append(row)
+
+        pivot_cols = []
+        r = 0
+        for col in range(n):
+            bit = 1 << col
+            pr = r
+            while pr < len(rows) and not rows[pr] & bit:
+                pr += 1
+            if pr == len(rows):
+                continue
+            rows[r], rows[pr] = rows[pr], rows[r]
+            pivot_row = rows[r]
+            for i in range(len(rows)):
+                if i != r and rows[i] & bit:
+                    rows[i] ^= pivot_row
+            pivot_cols.append(col)
+            r += 1
+        for row in rows[r:]:
+            if row == rhs_bit:
+                return None
+
+        particular = 0
+        for i, col in enumerate(pivot_cols):
+            if rows[i] & rhs_bit:
+                particular |= 1 << col
+        null_space = []
+        pivot_set = set(pivot_cols)
+        for free in range(n):
+            if free in pivot_set:
+                continue
+            vec = 1 << free
+            for i, col in enumerate(pivot_cols):
+                if rows[i] >> free & 1:
+                    vec |= 1 << col
+            null_space.append(vec)
+        return particular, null_space
+
+    def to_buttons(self, vec: int) -> list:
+        return [b for k, b in enumerate(self.buttons) if vec >> k & 1]
+
+
+def all_solutions(particular: int, null_space: list):
+    """Yield every solution, walking the null space in Gray code order"""
+    cur = particular
+    yield cur
+    for i in range(1, 1 << len(null_space)):
+        # bit that flips between gray(i-1) and gray(i)
+        flip = (i & -i).bit_length() - 1
+        cur ^= null_space[flip]
+        yield cur
+
+
+def min_solution(particular: int, null_space: list, max_nullity: int=24) -> int:
+    if len(null_space) > max_nullity:
+        raise ValueError(f'null space dimension {len(null_space)} is too large to enumerate')
+    best = particular
+    best_count = bin(particular).count('1')
+    for sol in all_solutions(particular, null_space):
+        count = bin(sol).count('1')
+        if count < best_count:
+            best, best_count = sol, count
+    return best
+
+
+def lights_out(n: int) -> dict:
+    """n x n lights out, pressing a lamp toggles itself and its 4 neighbors"""
+    steps = {}
+    for i in range(n):
+        for j in range(n):
+            lamps = [i * n + j + 1]
+            for di, dj in [(-1, 0), (0, -1), (0, 1), (1, 0)]:
+                ni, nj = i + di, j + dj
+                if 0 <= ni < n and 0 <= nj < n:
+                    lamps.append(ni * n + nj + 1)
+            steps[i * n + j + 1] = sorted(lamps)
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights-out', type=int, nargs='+', metavar='N',
+                        help='benchmark all-off n x n lights out boards')
+    parser.add_argument('--all', action='store_true', help='list every solution')
+    args = parser.parse_args()
+    if args.lights_out:
+        for n in args.lights_out:
+            start_time = time.time()
+            system = ToggleSystem(lights_out(n))
+            particular, null_space = system.solve([])
+            try:
+                best = min_solution(particular, null_space)
+                presses = f'min presses: {bin(best).count("1")}'
+            except ValueError:
+                presses = (f'{1 << len(null_space)} solutions, too many to enumerate; '
+                           f'particular solution presses: {bin(particular).count("1")}')
+            print(f'{n}x{n}: lamps: {n * n} nullity: {len(null_space)}', presses,
+                  f'({time.time() - start_time} seconds)')
+        return
+
+    from level_045 import lamps_step, start_lamps
+    system = ToggleSystem(lamps_step)
+    res = system.solve(start_lamps)
+    if res is None:
+        print('No solution')
+        return
+    particular, null_space = res
+    print('Null space:', [system.to_buttons(v) for v in null_space])
+    try:
+        print('Minimum presses:', system.to_buttons(min_solution(particular, null_space)))
+    except ValueError:
+        print(f'{1 << len(null_space)} solutions, too many to enumerate;',
+              'showing the particular solution')
+        print('Presses:', system.to_buttons(particular))
+        return
+    if args.all:
+        for sol in all_solutions(particular, null_space):
+            print(system.to_buttons(sol))
+
+
+if __name__ == '__main__':
+    main()
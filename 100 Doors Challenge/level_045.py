@@ -20,11 +20,34 @@ will be toggled on/off.
 
 The game is finish if all lamps are on. The solving algorithm
 is using BFS (with deque).
+
+There are two engines. The 'state' engine expands State objects: the
+lamps as 9-bit integer (lamp n is bit n-1), the parent state and the
+pressed button, so the steps are only collected for the solution.
+The 'bitmask' engine stores lamp configuration the same way,
+applies each press as XOR with precomputed mask and keeps the parent
+of each configuration in flat 512-entry arrays, so every configuration
+is visited at most once. The 'gf2' engine skips searching and solves
+the puzzle as linear system (see gf2.py). The 'search' engine runs the
+bitmask puzzle on the shared search engine (see search.py at the top
+of the repo), so --strategy and the other engine options apply. Its
+heuristic is the number of lamps that are off divided by the most lamps
+one press toggles (rounded up), which never overestimates, so astar and
+idastar find shortest solutions. --lights-out N runs it on n x n lights
+out instead (every lamp starts off), where plain BFS runs out of memory.
 """
 
+import argparse
+import os
+import sys
 import time
+from array import array
 from collections import deque
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import (Problem, Progress, add_arguments, no_solution_message, profile_from_args,
+                    progress_from_args, run_from_args)
+
 lamps_step = {
   1: [1, 6, 8],
   2: [2, 6, 7, 9],
@@ -37,78 +60,202 @@ lamps_step = {
   9: [2, 8, 9]
 }
 start_lamps = [1, 2, 7, 9]
+ALL_ON = (1 << 9) - 1
+
+
+def _init_step_masks() -> dict:
+  res = {}
+  for step, lamps in lamps_step.items():
+    mask = 0
+    for lamp in lamps:
+      mask |= 1 << (lamp - 1)
+    res[step] = mask
+  return res
+
+
+step_masks = _init_step_masks()
 
 
 class State:
-  def __init__(self, lamps: list=None, steps: list=None):
-    if lamps is None:
-      self.lamps = [False] * 10
-    else:
-      self.lamps = lamps
-    if steps is None:
-      self.steps = []
-    else:
-      self.steps = steps
+  __slots__ = ('lamps', 'parent', 'move', 'depth')
+
+  def __init__(self, lamps: int=0, parent: 'State'=None, move: int=None):
+    self.lamps = lamps
+    self.parent = parent
+    self.move = move
+    self.depth = 0 if parent is None else parent.depth + 1
+
+  @property
+  def steps(self) -> list:
+    res = []
+    state = self
+    while state.parent is not None:
+      res.append(state.move)
+      state = state.parent
+    res.reverse()
+    return res
 
   def finish(self) -> bool:
-    for lamp in self.lamps[1:]:
-      if not lamp:
-        return False
-    return True
+    return self.lamps == ALL_ON
 
   def print_lamps(self):
     s = ''
-    for lamp in self.lamps[1:]:
-      s += '1' if lamp else '0'
+    for lamp in range(1, 10):
+      s += '1' if self.lamps >> (lamp - 1) & 1 else '0'
     print(s)
 
   def print_steps(self):
     print(' -> '.join(map(str, self.steps)))
 
-  def step(self, step: int) -> 'State':
-    if step < 1 or step > 9:
+  def step(self, step: int, masks: dict=None) -> 'State':
+    if masks is None:
+      masks = step_masks
+    if step not in masks:
       return
-    lamps = lamps_step[step]
-    new_lamps = list(self.lamps)
-    new_steps = list(self.steps)
-    for lamp in lamps:
-      new_lamps[lamp] = not new_lamps[lamp]
-    new_steps.append(step)
-    return State(new_lamps, new_steps)
+    return State(self.lamps ^ masks[step], self, step)
+
+
+class LampsProblem(Problem):
+  """Lamp configurations as bitmasks, moves are button numbers"""
+  def __init__(self, start: int, masks: dict=None, all_on: int=ALL_ON):
+    self.start = start
+    self.masks = step_masks if masks is None else masks
+    self.all_on = all_on
+    self.max_toggles = max(bin(mask).count('1') for mask in self.masks.values())
+
+  def initial(self) -> int:
+    return self.start
+
+  def successors(self, mask: int) -> list:
+    return [(step, mask ^ step_mask) for step, step_mask in self.masks.items()]
+
+  def is_goal(self, mask: int) -> bool:
+    return mask == self.all_on
+
+  def heuristic(self, mask: int) -> int:
+    off = bin(self.all_on & ~mask).count('1')
+    return -(-off // self.max_toggles)
 
 
 def init_start_state() -> State:
-  lamps = [False] * 10
+  return State(init_start_mask())
+
+
+def init_start_mask() -> int:
+  mask = 0
   for lamp in start_lamps:
-    lamps[lamp] = True
-  return State(lamps=lamps)
+    mask |= 1 << (lamp - 1)
+  return mask
+
+
+def lights_out_masks(n: int) -> dict:
+  from gf2 import lights_out
+  res = {}
+  for button, lamps in lights_out(n).items():
+    res[button] = sum(1 << (lamp - 1) for lamp in lamps)
+  return res
+
+
+def replay(start: int, steps: list, masks: dict=None) -> State:
+  """State reached from lamps start by pressing steps"""
+  state = State(start)
+  for step in steps:
+    state = state.step(step, masks)
+  return state
 
 
 def main():
-  start_state = init_start_state()
-  q = deque([start_state])
-  solution = solve(q)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--engine', choices=['state', 'bitmask', 'gf2', 'search'], default='state')
+  parser.add_argument('--lights-out', type=int, metavar='N',
+                      help='search engine only: solve all-off n x n lights out')
+  add_arguments(parser)
+  args = parser.parse_args()
+  if args.lights_out and args.engine != 'search':
+    parser.error('--lights-out needs --engine search')
+  progress = progress_from_args(args)
+  profile_from_args(args, [
+    (State, ('step', 'finish')),
+    (LampsProblem, ('successors', 'heuristic')),
+  ])
+  start_time = time.time()
+  if args.engine == 'bitmask':
+    solution = solve_bitmask(init_start_mask())
+  elif args.engine == 'gf2':
+    solution = solve_gf2()
+  elif args.engine == 'search' and args.lights_out:
+    n = args.lights_out
+    solution = solve_search(0, args, lights_out_masks(n), (1 << (n * n)) - 1)
+  elif args.engine == 'search':
+    solution = solve_search(init_start_mask(), args)
+  else:
+    start_state = init_start_state()
+    q = deque([start_state])
+    solution = solve(q, progress)
+  progress.log(f'Engine: {args.engine} ({time.time() - start_time} seconds)')
+  if solution is None:
+    print(no_solution_message(args))
+    return
   solution.print_steps()
 
 
-def solve(q: deque) -> State:
-  start_time = time.time()
-  last_steps_num = -1
+def solve(q: deque, progress: Progress=None) -> State:
+  if progress is None:
+    progress = Progress()
+  nodes = 0
   while q:
     s: State
     s = q.popleft()
-    if len(s.steps) > last_steps_num:
-      print(f'Elasped time: {time.time() - start_time} seconds')
-      print('Longest steps:', len(s.steps))
-      print('Current queue:', len(q))
-      last_steps_num += 1
+    nodes += 1
+    progress.update(nodes, len(q), s.depth)
     if s.finish():
       return s
     for step in range(1, 10):
-      if s.steps and s.steps[-1] == step:
+      if s.move == step:
         continue
       q.append(s.step(step))
-  return init_start_state()
+  return None
+
+
+def solve_bitmask(start: int) -> State:
+  # parent[mask] is the configuration mask was reached from, -1 if unvisited
+  parent = array('h', [-1]) * (ALL_ON + 1)
+  parent_step = bytearray(ALL_ON + 1)
+  parent[start] = start
+  q = deque([start])
+  while q:
+    cur = q.popleft()
+    if cur == ALL_ON:
+      steps = []
+      while cur != start:
+        steps.append(parent_step[cur])
+        cur = parent[cur]
+      steps.reverse()
+      return replay(start, steps)
+    for step in range(1, 10):
+      nxt = cur ^ step_masks[step]
+      if parent[nxt] == -1:
+        parent[nxt] = cur
+        parent_step[nxt] = step
+        q.append(nxt)
+  return None
+
+
+def solve_search(start: int, args, masks: dict=None, all_on: int=ALL_ON) -> State:
+  node = run_from_args(LampsProblem(start, masks, all_on), args)
+  if node is None:
+    return None
+  return replay(start, node.path(), masks)
+
+
+def solve_gf2() -> State:
+  # presses commute, so the minimum press set is also a shortest sequence
+  from gf2 import ToggleSystem, min_solution
+  system = ToggleSystem(lamps_step)
+  res = system.solve(start_lamps)
+  if res is None:
+    return None
+  return replay(init_start_mask(), system.to_buttons(min_solution(*res)))
 
 
 if __name__ == '__main__':
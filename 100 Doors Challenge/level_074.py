@@ -51,10 +51,43 @@ changes the row and increase the column's index.
 If agent on odd-row cell, go Left-Up and Left-Down changes
 the row and decrease the column's index  and go Right-Up and Right-Down
 will changes the row only.
+
+The 'bitboard' engine packs the playable cells into one int (cell (r, c)
+is bit r * width + c). For every cell and direction it precomputes the
+ray of cells the agent would pass, following even_steps/odd_steps as
+the row parity changes, so a move only tests bits along the ray and
+clears the passed cells with one mask. Positions (bitboard, agent)
+proven to have no solution are remembered in a transposition table.
+
+The 'inplace' engine searches depth first like the 'board' engine, but
+on a single cells grid: a move marks the passed cells as blocks and is
+undone when its subtree fails, so no board is copied. Every direction
+is tried in order at every position.
+
+With --prune the engines reject a board right after the move when
+the playable cells are no longer connected to the agent, or when more
+than one playable cell has at most one playable/agent neighbor (the
+agent's trail is a path, so such a cell can only be its last cell).
+
+Other levels can be loaded from text files (--level) which contain the
+board in the same 2-D form as initial_board: one row per line, cells
+separated by space. Empty lines and lines starting with # are ignored.
+--batch solves every level file in a directory with the bitboard engine
+in a process pool and prints one JSON object per solved file.
 """
 
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import (Problem, add_arguments, no_solution_message, profile_from_args,
+                    progress_from_args, run_from_args)
+
 directions = ['LU', 'RU', 'R', 'RD', 'LD', 'L']
 even_steps = {
     'LU': (-1, 0),
@@ -114,10 +147,10 @@ class Board:
             step = self._next_step(curpos[0] %2 == 0, self.last_direction_idx)
             napos = (curpos[0] + step[0], curpos[1] + step[1])
         nsteps = self.steps + [directions[self.last_direction_idx]]
-        self.last_direction_idx += 1
         return Board(cells=ncells, steps=nsteps)
 
     def find_possible_direction_index(self):
+        """Move past the direction tried last to the next open one, past the end if none"""
         r, c = self.agent_pos
         even = r % 2 == 0
         for i in range(self.last_direction_idx+1, len(directions)):
@@ -125,6 +158,8 @@ class Board:
             if self._valid_pos((r + dr, c + dc)) and self.cells[r + dr][c + dc] == 'O':
                 self.last_direction_idx = i
                 break
+        else:
+            self.last_direction_idx = len(directions)
     
     def is_finish(self) -> bool:
         for row in self.cells:
@@ -179,15 +214,306 @@ class Board:
         r, c = pos
         return 0 <= r < len(self.cells) and 0 <= c < len(self.cells[0])
 
+class BitBoard:
+    def __init__(self, rows: list=None):
+        if rows is None:
+            rows = initial_board
+        self.cells = [row.split() for row in rows]
+        self.height = len(self.cells)
+        self.width = len(self.cells[0])
+        self.free = 0
+        self.agent = -1
+        for r, row in enumerate(self.cells):
+            for c, cell in enumerate(row):
+                if cell == 'O':
+                    self.free |= 1 << (r * self.width + c)
+                elif cell == 'V':
+                    self.agent = r * self.width + c
+        self._init_rays()
+        self.dead = set()
+        self.nodes = 0
+        self.pruner = None
+        self.progress = None
+
+    def solve(self) -> list:
+        steps = self._search(self.free, self.agent)
+        if steps is None:
+            return None
+        steps.reverse()
+        return [directions[d] for d in steps]
+
+    def final_cells(self, steps: list) -> list:
+        cells = deepcopy(self.cells)
+        free, agent = self.free, self.agent
+        for drc in steps:
+            free, agent = self._move(free, agent, directions.index(drc))
+        for row in cells:
+            for c, cell in enumerate(row):
+                if cell in ('O', 'V'):
+                    row[c] = 'X'
+        r, c = divmod(agent, self.width)
+        cells[r][c] = 'V'
+        return cells
+
+    def _init_rays(self):
+        # rays[idx][d] is tuple of (bit, mask of ray up to bit, idx)
+        self.rays = []
+        for idx in range(self.height * self.width):
+            r, c = divmod(idx, self.width)
+            per_direction = []
+            for drc in directions:
+                ray = []
+                mask = 0
+                pr, pc = r, c
+                while True:
+                    dr, dc = even_steps[drc] if pr % 2 == 0 else odd_steps[drc]
+                    pr, pc = pr + dr, pc + dc
+                    if not (0 <= pr < self.height and 0 <= pc < self.width):
+                        break
+                    if self.cells[pr][pc] not in ('O', 'V'):
+                        break
+                    nidx = pr * self.width + pc
+                    mask |= 1 << nidx
+                    ray.append((1 << nidx, mask, nidx))
+                per_direction.append(tuple(ray))
+            self.rays.append(tuple(per_direction))
+
+    def _move(self, free: int, agent: int, direction_idx: int) -> tuple:
+        passed = 0
+        nagent = agent
+        for bit, mask, idx in self.rays[agent][direction_idx]:
+            if not free & bit:
+                break
+            passed = mask
+            nagent = idx
+        return free & ~passed, nagent
+
+    def _search(self, free: int, agent: int, depth: int=0) -> list:
+        if not free:
+            return []
+        key = (free, agent)
+        if key in self.dead:
+            return None
+        self.nodes += 1
+        if self.progress is not None:
+            self.progress.update(self.nodes, None, depth)
+        for d in range(len(directions)):
+            nfree, nagent = self._move(free, agent, d)
+            if nagent == agent:
+                continue
+            if self.pruner is not None and self.pruner.reject(nfree, nagent, depth + 1):
+                continue
+            res = self._search(nfree, nagent, depth + 1)
+            if res is not None:
+                res.append(d)
+                return res
+        self.dead.add(key)
+        return None
+
+
+class SlideProblem(Problem):
+    """(free cells, agent, moves made) of a BitBoard, moves are direction indices"""
+    def __init__(self, bitboard: BitBoard):
+        self.bitboard = bitboard
+
+    def initial(self) -> tuple:
+        return (self.bitboard.free, self.bitboard.agent, 0)
+
+    def successors(self, state: tuple) -> list:
+        free, agent, depth = state
+        bitboard = self.bitboard
+        res = []
+        for d in range(len(directions)):
+            nfree, nagent = bitboard._move(free, agent, d)
+            if nagent == agent:
+                continue
+            if bitboard.pruner is not None and bitboard.pruner.reject(nfree, nagent, depth + 1):
+                continue
+            res.append((d, (nfree, nagent, depth + 1)))
+        return res
+
+    def is_goal(self, state: tuple) -> bool:
+        return not state[0]
+
+    def key(self, state: tuple) -> tuple:
+        return state[:2]
+
+
+class Pruner:
+    rules = ('disconnected', 'dead_ends')
+
+    def __init__(self, bitboard: BitBoard):
+        self.width = bitboard.width
+        self.neighbors = []
+        for per_direction in bitboard.rays:
+            mask = 0
+            for ray in per_direction:
+                if ray:
+                    mask |= ray[0][0]
+            self.neighbors.append(mask)
+        # cuts[rule][depth] is number of boards rejected after depth moves
+        self.cuts = {rule: [] for rule in self.rules}
+
+    def reject(self, free: int, agent: int, depth: int) -> bool:
+        neighbors = self.neighbors
+        open_cells = free | (1 << agent)
+        seen = 1 << agent
+        stack = [agent]
+        dead_ends = 0
+        while stack:
+            idx = stack.pop()
+            nbrs = neighbors[idx] & open_cells
+            if idx != agent and bin(nbrs).count('1') <= 1:
+                dead_ends += 1
+            new = nbrs & ~seen
+            seen |= new
+            while new:
+                low = new & -new
+                stack.append(low.bit_length() - 1)
+                new ^= low
+        if free & ~seen:
+            self._count('disconnected', depth)
+            return True
+        if dead_ends > 1:
+            self._count('dead_ends', depth)
+            return True
+        return False
+
+    def reject_board(self, board: Board) -> bool:
+        free = 0
+        for r, row in enumerate(board.cells):
+            for c, cell in enumerate(row):
+                if cell == 'O':
+                    free |= 1 << (r * self.width + c)
+        r, c = board.agent_pos
+        return self.reject(free, r * self.width + c, len(board.steps))
+
+    def report(self):
+        for rule in self.rules:
+            cuts = self.cuts[rule]
+            print(f'Pruned by {rule}: {sum(cuts)}', 'per depth:', cuts)
+
+    def _count(self, rule: str, depth: int):
+        cuts = self.cuts[rule]
+        while len(cuts) <= depth:
+            cuts.append(0)
+        cuts[depth] += 1
+
+
+def read_from_file(path: str) -> list:
+    rows = []
+    for line in open(path).read().split('\n'):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            rows.append(' '.join(line.split()))
+    width = len(rows[0].split())
+    for row in rows:
+        if len(row.split()) != width:
+            raise ValueError(f'{path}: every row must have {width} cells')
+    if sum(row.split().count('V') for row in rows) != 1:
+        raise ValueError(f'{path}: board must have exactly one agent (V)')
+    return rows
+
+
+def solve_level(path: str, prune: bool=False) -> dict:
+    start_time = time.time()
+    rows = read_from_file(path)
+    bitboard = BitBoard(rows)
+    if prune:
+        bitboard.pruner = Pruner(bitboard)
+    steps = bitboard.solve()
+    return {
+        'level': os.path.basename(path),
+        'solved': steps is not None,
+        'time': time.time() - start_time,
+        'nodes': bitboard.nodes,
+        'steps': steps,
+    }
+
+
+def solve_batch(directory: str, prune: bool=False, workers: int=None):
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+    paths = [path for path in paths if os.path.isfile(path)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(solve_level, path, prune): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                res = future.result()
+            except Exception as e:
+                res = {'level': os.path.basename(futures[future]), 'error': str(e)}
+            print(json.dumps(res), flush=True)
+
+
 def main():
-    board = Board()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', choices=['board', 'inplace', 'bitboard', 'search'],
+                        default='board')
+    parser.add_argument('--prune', action='store_true',
+                        help='reject disconnected boards and boards with dead ends')
+    parser.add_argument('--level', help='level file (default: initial_board)')
+    parser.add_argument('--batch', metavar='DIR', help='solve every level file in DIR')
+    parser.add_argument('--workers', type=int, help='batch processes (default: CPU count)')
+    add_arguments(parser, default='dfs')
+    args = parser.parse_args()
+    if args.batch:
+        solve_batch(args.batch, args.prune, args.workers)
+        return
+    rows = read_from_file(args.level) if args.level else initial_board
+    start_time = time.time()
+    progress = progress_from_args(args)
+    profile_from_args(args, [
+        (Board, ('do_possible_move', 'possible_neighbors', 'is_finish', 'is_dead')),
+        (BitBoard, ('_move',)),
+        (SlideProblem, ('successors',)),
+        (Pruner, ('reject', 'reject_board')),
+    ])
+    pruner = Pruner(BitBoard(rows)) if args.prune else None
+    if args.engine in ('bitboard', 'search'):
+        bitboard = BitBoard(rows)
+        bitboard.pruner = pruner
+        bitboard.progress = progress
+        if args.engine == 'search':
+            node = run_from_args(SlideProblem(bitboard), args)
+            steps = None if node is None else [directions[d] for d in node.path()]
+        else:
+            steps = bitboard.solve()
+        progress.log(f'Engine: {args.engine} ({time.time() - start_time} seconds)')
+        if args.engine == 'bitboard':
+            progress.log('Nodes:', bitboard.nodes, 'dead positions:', len(bitboard.dead))
+        if pruner is not None and progress.verbosity:
+            pruner.report()
+        if steps is None:
+            print(no_solution_message(args))
+            return
+        Board._print_cells(bitboard.final_cells(steps))
+        print('Steps:', steps)
+        return
+    if args.engine == 'inplace':
+        res = solve_inplace(rows, pruner, progress)
+        progress.log(f'Engine: inplace ({time.time() - start_time} seconds)')
+        if pruner is not None and progress.verbosity:
+            pruner.report()
+        if res is None:
+            print('No solution')
+            return
+        cells, steps = res
+        Board._print_cells(cells)
+        print('Steps:', steps)
+        return
+    board = Board([row.split() for row in rows])
     stack = [board]
-    solution = solve(stack)
+    solution = solve(stack, pruner)
+    progress.log(f'Engine: board ({time.time() - start_time} seconds)')
+    if pruner is not None and progress.verbosity:
+        pruner.report()
+    if solution is None:
+        print('No solution')
+        return
     solution.print_cells()
     print('Steps:', solution.steps)
 
 
-def solve(stack: list):
+def solve(stack: list, pruner: Pruner=None):
     while stack:
         cur_board = stack[-1]
         if cur_board.is_finish():
@@ -197,7 +523,85 @@ def solve(stack: list):
             if stack:
                 stack[-1].find_possible_direction_index()
         else:
-            stack.append(cur_board.do_possible_move())
+            nboard = cur_board.do_possible_move()
+            if pruner is not None and pruner.reject_board(nboard):
+                # same as pushing it and popping it as dead
+                cur_board.find_possible_direction_index()
+            else:
+                stack.append(nboard)
+
+
+def solve_inplace(rows: list, pruner: Pruner=None, progress=None) -> tuple:
+    """
+    Depth first search on one cells grid. A move turns the cells the
+    agent passes into X in place and is undone from the list of those
+    cells, directions are tried one at a time, so memory is O(moves)
+    instead of a copied board per move. Returns the final cells and the
+    steps, None if there is no solution.
+    """
+    cells = [row.split() for row in rows]
+    height, width = len(cells), len(cells[0])
+    agent = None
+    remaining = 0
+    free = 0
+    for r, row in enumerate(cells):
+        for c, cell in enumerate(row):
+            if cell == 'O':
+                remaining += 1
+                free |= 1 << (r * width + c)
+            elif cell == 'V':
+                agent = (r, c)
+    # the agent cell is left behind as a block by the first move
+    cells[agent[0]][agent[1]] = 'X'
+    steps = []
+    nodes = 0
+
+    def search(r: int, c: int) -> tuple:
+        nonlocal remaining, free, nodes
+        if not remaining:
+            return r, c
+        nodes += 1
+        if progress is not None:
+            progress.update(nodes, None, len(steps))
+        for drc in directions:
+            passed = []
+            pr, pc = r, c
+            while True:
+                dr, dc = even_steps[drc] if pr % 2 == 0 else odd_steps[drc]
+                nr, nc = pr + dr, pc + dc
+                if not (0 <= nr < height and 0 <= nc < width) or cells[nr][nc] != 'O':
+                    break
+                cells[nr][nc] = 'X'
+                passed.append((nr, nc))
+                pr, pc = nr, nc
+            if not passed:
+                continue
+            remaining -= len(passed)
+            steps.append(drc)
+            if pruner is not None:
+                before = free
+                for nr, nc in passed:
+                    free &= ~(1 << (nr * width + nc))
+            if pruner is None or not pruner.reject(free, pr * width + pc, len(steps)):
+                res = search(pr, pc)
+                if res is not None:
+                    return res
+            if pruner is not None:
+                free = before
+            steps.pop()
+            remaining += len(passed)
+            for nr, nc in passed:
+                cells[nr][nc] = 'O'
+        return None
+
+    end = search(*agent)
+    if progress is not None:
+        progress.log('Nodes:', nodes)
+    if end is None:
+        return None
+    cells[end[0]][end[1]] = 'V'
+    return cells, steps
+
 
 if __name__ == '__main__':
     main()
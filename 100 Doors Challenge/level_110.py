@@ -5,46 +5,133 @@ and the final state is 89346575
 
 Each two-consecutive-numbers can be moved
 78 569354 can be moved to 5 78 69354, 56 78 9354, etc...
+
+A move swaps two pairs, so every move is its own inverse and the
+search can run from the goal as well. The 'bidir' mode does that and
+meets in the middle. It keys each text by packed integer (digit k is
+stored in bits 4k..4k+3) and applies a move as XOR swap of two 8-bit
+fields, so no string is built until the solution is found.
+
+There are only 8!/multiplicities arrangements of the digits, so the
+whole space can be searched once from the goal (--build-table). Every
+arrangement is ranked among the permutations of the goal's multiset
+and the table stores one distance byte and one next-move byte per rank.
+The 'table' mode memory-maps that file and answers by following the
+next moves. The header holds the goal and a digest of the move set, a
+table built for another goal or move set is refused.
+
+The 'search' mode runs the packed puzzle on the shared search engine
+(see search.py at the top of the repo) with --strategy and its options.
+Strategies which need a heuristic (astar, idastar, ...) get one from
+additive pattern databases. The goal's digits are split in groups of
+about --pattern-size positions (equal digits stay in one group) and for
+every group the text is abstracted by blanking the other digits. A move
+costs a group the number of its digits among the 4 moved cells, in
+quarter moves, so the groups' costs of one move add up to exactly one
+move and the sum of their distances never overestimates. Every table is
+built once by Dijkstra over the abstract texts and cached next to this
+file (or in --pdb-dir) as .pdb, tables for another goal, group or move
+set are rebuilt.
 """
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
 import time
 from collections import deque
 from copy import copy
+from math import factorial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import (INFORMED, Problem, Progress, add_arguments, no_solution_message,
+                    profile_from_args, progress_from_args, run_from_args)
+
+START = '78569354'
+GOAL = '89346575'
+TABLE_MAGIC = b'L110'
+TABLE_VERSION = 1
+PDB_MAGIC = b'P110'
+PDB_VERSION = 1
+# magic, version, goal length, move set digest, number of entries
+TABLE_HEADER = struct.Struct('<4sHH20sI')
+UNREACHABLE = 0xFF
+# blank of pattern database texts
+BLANK = '*'
+
+
+def make_steps(length: int) -> list:
+    res = []
+    for i in range(0, length - 2):
+        for j in range(i+2, length - 1):
+            res.append((i, j))
+    return res
+
+
+def make_perms(steps: list, length: int) -> list:
+    # new_text[k] = text[perm[k]]
+    res = []
+    for sp, ep in steps:
+        perm = list(range(length))
+        perm[sp], perm[sp+1], perm[ep], perm[ep+1] = ep, ep+1, sp, sp+1
+        res.append(tuple(perm))
+    return res
 
-steps = []
-for i in range(0, 6):
-    for j in range(i+2, 7):
-        steps.append((i, j))
-for step in steps:
-    print(step)
+
+steps = make_steps(8)
+step_perms = make_perms(steps, 8)
+
+
+def pack(text: str) -> int:
+    key = 0
+    for k, c in enumerate(text):
+        key |= int(c) << (4 * k)
+    return key
+
+
+def unpack(key: int, length: int) -> str:
+    return ''.join(str((key >> (4 * k)) & 0xF) for k in range(length))
 
 
 class State:
-    def __init__(self, text: str, steps: list=None):
+    """
+    A text and the step which made it from parent. Children point to
+    their parent instead of copying its steps, so a state in the BFS
+    queue costs the same at any depth; steps walks the parents back.
+    """
+    __slots__ = ('text', 'parent', 'step', 'depth')
+
+    def __init__(self, text: str, parent: 'State'=None, step: tuple=None):
         self.text = text
-        if steps is None:
-            self.steps = []
-        else:
-            self.steps = steps
-    
-    def is_finish(self) -> bool:
-        return self.text == '89346575'
+        self.parent = parent
+        self.step = step
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    @property
+    def steps(self) -> list:
+        res = []
+        state = self
+        while state.parent is not None:
+            res.append(state.step)
+            state = state.parent
+        res.reverse()
+        return res
 
-    def is_nothing(self) -> bool:
-        return self.text == '78569354'
+    def is_finish(self, goal: str=GOAL) -> bool:
+        return self.text == goal
+
+    def is_nothing(self, start: str=START) -> bool:
+        return self.text == start
 
     def _is_repeated(self, step: tuple) -> bool:
-        return self.steps[-1] == step
-
-    def move(self, step: tuple) -> 'State':
-        sp, ep = step
-        text = list(self.text)
-        tsp, tep = text[sp:sp+2]
-        text[sp] = text[ep]
-        text[sp+1] = text[ep+1]
-        text[ep] = tsp
-        text[ep+1] = tep
-        nsteps = self.steps + [step]
-        return State(''.join(text), steps=nsteps)
+        return self.step == step
+
+    def move(self, step: tuple, perm: tuple=None) -> 'State':
+        if perm is None:
+            perm = make_perms([step], len(self.text))[0]
+        text = self.text
+        return State(''.join([text[k] for k in perm]), self, step)
 
     def steps_string(self) -> str:
         text = []
@@ -53,32 +140,448 @@ class State:
         return '(' + ', '.join(text) + ')'
 
 
+class KeyPassProblem(Problem):
+    """Packed texts (see pack), moves are indices into make_steps(len(start))"""
+    def __init__(self, start: str, goal: str, pdb: 'PatternDatabase'=None):
+        self.length = len(start)
+        self.start = pack(start)
+        self.goal = pack(goal)
+        self.swaps = [(4 * sp, 4 * ep) for sp, ep in make_steps(len(start))]
+        self.pdb = pdb
+
+    def initial(self) -> int:
+        return self.start
+
+    def successors(self, key: int) -> list:
+        res = []
+        for m, (si, sj) in enumerate(self.swaps):
+            diff = ((key >> si) ^ (key >> sj)) & 0xFF
+            res.append((m, key ^ (diff << si) ^ (diff << sj)))
+        return res
+
+    def is_goal(self, key: int) -> bool:
+        return key == self.goal
+
+    def heuristic(self, key: int) -> int:
+        if self.pdb is None:
+            return 0
+        return self.pdb.heuristic(unpack(key, self.length))
+
+
 def main():
-    q = deque([State('78569354')])
-    sol = solve(q)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('start', nargs='?', default=START)
+    parser.add_argument('goal', nargs='?', default=GOAL)
+    parser.add_argument('--mode', choices=['bfs', 'bidir', 'table', 'search'], default='bfs')
+    parser.add_argument('--build-table', action='store_true',
+                        help='search the whole space from goal and write the table')
+    parser.add_argument('--table', help='table path (default: next to this file)')
+    parser.add_argument('--pattern-size', type=int, default=4,
+                        help='digits per pattern database of the search heuristic')
+    parser.add_argument('--pdb-dir', help='pattern database directory (default: next to this file)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if len(args.start) != len(args.goal) or sorted(args.start) != sorted(args.goal):
+        parser.error('start and goal must be permutation of each other')
+    table_path = args.table or default_table_path(args.goal)
+    progress = progress_from_args(args)
+    profile_from_args(args, [
+        (State, ('move', 'is_finish')),
+        (KeyPassProblem, ('successors', 'heuristic')),
+        (PatternDatabase, ('heuristic',)),
+        (sys.modules[__name__], ('build_pattern_table', 'build_table')),
+    ])
+    if progress.verbosity > 1:
+        print('Moves:', table_moves(len(args.goal)))
+    if args.build_table:
+        start_time = time.time()
+        count, reached, depth = build_table(args.goal, table_path)
+        progress.log(f'Table: {table_path} entries: {count} reachable: {reached}',
+                     f'max distance: {depth} ({time.time() - start_time} seconds)')
+        return
+    if odd_permutation(args.start, args.goal):
+        print(no_solution_message(args), '(goal is an odd permutation of start)')
+        return
+    if args.mode == 'bidir':
+        sol = solve_bidir(args.start, args.goal, progress)
+    elif args.mode == 'search':
+        pdb = None
+        if args.strategy in INFORMED:
+            start_time = time.time()
+            pdb = PatternDatabase(args.goal, args.pattern_size, args.pdb_dir)
+            progress.log(f'Pattern databases: {pdb.groups} built: {pdb.built}',
+                         f'({time.time() - start_time} seconds)')
+        sol = solve_search(args.start, args.goal, args, pdb)
+    elif args.mode == 'table':
+        try:
+            table = DistanceTable(table_path, args.goal)
+        except (OSError, ValueError) as e:
+            parser.error(f'{e}, run with --build-table first')
+        start_time = time.time()
+        sol = table.solve(args.start)
+        progress.log('lookup time:', time.time() - start_time, 'seconds')
+        table.close()
+    else:
+        q = deque([State(args.start)])
+        sol = solve(q, args.start, args.goal, progress)
+    if sol is None:
+        print(no_solution_message(args))
+        return
     print('Solution:', sol.steps_string())
     print('text:', sol.text)
 
-def solve(q: deque) -> State:
-    start_time = time.time()
-    longest_steps = 0
+def solve(q: deque, start: str=START, goal: str=GOAL, progress: Progress=None) -> State:
+    if progress is None:
+        progress = Progress()
+    nodes = 0
     cur: State
     while q:
         cur = q.popleft()
-        if longest_steps < len(cur.steps):
-            longest_steps = len(cur.steps)
-            print('==============================')
-            print('longest steps:', longest_steps)
-            print('current queues:', len(q))
-            print('elapsed time:', time.time() - start_time, 'seconds')
-            print('==============================')
-        if cur.is_finish():
+        nodes += 1
+        progress.update(nodes, len(q), cur.depth)
+        if cur.is_finish(goal):
             return cur
-        for step in steps:
-            nstate = cur.move(step)
-            if not nstate.is_nothing():
+        if len(cur.text) == 8:
+            moves = zip(steps, step_perms)
+        else:
+            lsteps = make_steps(len(cur.text))
+            moves = zip(lsteps, make_perms(lsteps, len(cur.text)))
+        for step, perm in moves:
+            nstate = cur.move(step, perm)
+            if not nstate.is_nothing(start):
                 q.append(nstate)
-    return State('78569354')
+    return None
+
+
+def solve_search(start: str, goal: str, args, pdb: 'PatternDatabase'=None) -> State:
+    node = run_from_args(KeyPassProblem(start, goal, pdb), args)
+    if node is None:
+        return None
+    return replay(start, node.path())
+
+
+def solve_bidir(start: str, goal: str, progress: Progress=None) -> State:
+    if progress is None:
+        progress = Progress()
+    nodes = 0
+    moves = make_steps(len(start))
+    swaps = [(4 * sp, 4 * ep) for sp, ep in moves]
+    skey = pack(start)
+    gkey = pack(goal)
+    # seen[side][key] = (parent key, move index, depth)
+    seen = [{skey: (None, -1, 0)}, {gkey: (None, -1, 0)}]
+    frontier = [[skey], [gkey]]
+    depth = [0, 0]
+    meet = skey if skey == gkey else None
+    while meet is None and frontier[0] and frontier[1]:
+        side = 0 if len(frontier[0]) <= len(frontier[1]) else 1
+        mine = seen[side]
+        other = seen[1 - side]
+        ndepth = depth[side] + 1
+        best = None
+        nfrontier = []
+        for key in frontier[side]:
+            nodes += 1
+            progress.update(nodes, len(frontier[side]) + len(nfrontier), sum(depth))
+            for m, (si, sj) in enumerate(swaps):
+                diff = ((key >> si) ^ (key >> sj)) & 0xFF
+                nkey = key ^ (diff << si) ^ (diff << sj)
+                if nkey in mine:
+                    continue
+                mine[nkey] = (key, m, ndepth)
+                nfrontier.append(nkey)
+                if nkey in other:
+                    total = ndepth + other[nkey][2]
+                    if best is None or total < best[0]:
+                        best = (total, nkey)
+        frontier[side] = nfrontier
+        depth[side] = ndepth
+        if best is not None:
+            meet = best[1]
+    if meet is None:
+        return None
+
+    path = []
+    key = meet
+    while seen[0][key][0] is not None:
+        key, m, _ = seen[0][key]
+        path.append(m)
+    path.reverse()
+    key = meet
+    while seen[1][key][0] is not None:
+        # moves are self-inverse, so walking back to goal replays them
+        nkey, m, _ = seen[1][key]
+        path.append(m)
+        key = nkey
+    return replay(start, path)
+
+
+def odd_permutation(start: str, goal: str) -> bool:
+    """
+    Whether goal is an odd permutation of start made of distinct digits.
+    Every move swaps two pairs, an even permutation, so such a goal is
+    never reached.
+    """
+    if len(set(start)) != len(start):
+        return False
+    perm = [start.index(c) for c in goal]
+    odd = False
+    seen = [False] * len(perm)
+    for i in range(len(perm)):
+        # a cycle of even length is an odd number of transpositions
+        length = 0
+        while not seen[i]:
+            seen[i] = True
+            i = perm[i]
+            length += 1
+        if length and length % 2 == 0:
+            odd = not odd
+    return odd
+
+
+def replay(start: str, path: list) -> State:
+    """State reached from start by path, indices into make_steps(len(start))"""
+    moves = make_steps(len(start))
+    perms = make_perms(moves, len(start))
+    state = State(start)
+    for m in path:
+        state = state.move(moves[m], perms[m])
+    return state
+
+
+
+class MultisetRanker:
+    """Rank/unrank permutations of a multiset in lexicographic order"""
+    def __init__(self, text: str):
+        self.length = len(text)
+        self.symbols = sorted(set(text))
+        self.counts = [text.count(c) for c in self.symbols]
+        self.size = self._arrangements(self.counts, self.length)
+
+    def rank(self, text: str) -> int:
+        counts = list(self.counts)
+        remaining = self.length
+        res = 0
+        for c in text:
+            remaining -= 1
+            for k, sym in enumerate(self.symbols):
+                if sym == c:
+                    counts[k] -= 1
+                    break
+                if counts[k]:
+                    counts[k] -= 1
+                    res += self._arrangements(counts, remaining)
+                    counts[k] += 1
+        return res
+
+    @staticmethod
+    def _arrangements(counts: list, n: int) -> int:
+        res = factorial(n)
+        for c in counts:
+            res //= factorial(c)
+        return res
+
+
+def table_moves(length: int) -> list:
+    return steps if length == len(GOAL) else make_steps(length)
+
+
+def moves_digest(goal: str, moves: list) -> bytes:
+    return hashlib.sha1(f'{goal}:{moves}'.encode()).digest()
+
+
+def default_table_path(goal: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f'level_110_{goal}.tbl')
+
+
+def build_table(goal: str, path: str) -> tuple:
+    moves = table_moves(len(goal))
+    swaps = [(4 * sp, 4 * ep) for sp, ep in moves]
+    ranker = MultisetRanker(goal)
+    gkey = pack(goal)
+    # key -> index of move that leads one step closer to goal
+    seen = {gkey: UNREACHABLE}
+    dist = bytearray([UNREACHABLE]) * ranker.size
+    nmove = bytearray([UNREACHABLE]) * ranker.size
+    frontier = [gkey]
+    depth = 0
+    while frontier:
+        for key in frontier:
+            r = ranker.rank(unpack(key, len(goal)))
+            dist[r] = depth
+            nmove[r] = seen[key]
+        depth += 1
+        nfrontier = []
+        for key in frontier:
+            for m, (si, sj) in enumerate(swaps):
+                diff = ((key >> si) ^ (key >> sj)) & 0xFF
+                nkey = key ^ (diff << si) ^ (diff << sj)
+                if nkey not in seen:
+                    # moves are self-inverse, m also leads back to key
+                    seen[nkey] = m
+                    nfrontier.append(nkey)
+        frontier = nfrontier
+    header = TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, len(goal),
+                               moves_digest(goal, moves), ranker.size)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(header)
+        f.write(goal.encode())
+        f.write(dist)
+        f.write(nmove)
+    os.replace(path + '.tmp', path)
+    return ranker.size, len(seen), depth - 1
+
+
+class DistanceTable:
+    def __init__(self, path: str, goal: str):
+        self.goal = goal
+        self.moves = table_moves(len(goal))
+        self.ranker = MultisetRanker(goal)
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < TABLE_HEADER.size:
+            self.close()
+            raise ValueError(f'{path} is not a level 110 table (version {TABLE_VERSION})')
+        magic, version, length, digest, count = TABLE_HEADER.unpack_from(self._mm)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a level 110 table (version {TABLE_VERSION})')
+        self._offset = TABLE_HEADER.size + length
+        # distance and next move byte of every rank after the header and goal
+        if len(self._mm) != self._offset + 2 * count:
+            self.close()
+            raise ValueError(f'{path} is truncated or corrupt')
+        stored_goal = self._mm[TABLE_HEADER.size:self._offset].decode(errors='replace')
+        if stored_goal != goal or digest != moves_digest(goal, self.moves) \
+                or count != self.ranker.size:
+            self.close()
+            raise ValueError(f'{path} was built for goal {stored_goal} or another move set')
+        self.count = count
+
+    def distance(self, text: str) -> int:
+        return self._mm[self._offset + self.ranker.rank(text)]
+
+    def solve(self, start: str) -> State:
+        state = State(start)
+        r = self.ranker.rank(start)
+        if self._mm[self._offset + r] == UNREACHABLE:
+            return None
+        while state.text != self.goal:
+            m = self._mm[self._offset + self.count + r]
+            state = state.move(self.moves[m])
+            r = self.ranker.rank(state.text)
+        return state
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def pattern_groups(goal: str, size: int) -> list:
+    """Digits of goal in groups of at most size positions, equal digits stay together"""
+    res = []
+    group = ''
+    count = 0
+    for digit in sorted(set(goal), key=goal.index):
+        n = goal.count(digit)
+        if group and count + n > size:
+            res.append(group)
+            group = ''
+            count = 0
+        group += digit
+        count += n
+    res.append(group)
+    return res
+
+
+def abstract(text: str, digits: str) -> str:
+    return ''.join(c if c in digits else BLANK for c in text)
+
+
+def default_pdb_path(goal: str, digits: str, directory: str=None) -> str:
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(directory, f'level_110_{goal}_{digits}.pdb')
+
+
+def build_pattern_table(goal: str, digits: str, moves: list) -> bytearray:
+    """Distance in quarter moves from every abstract text to the abstract goal"""
+    perms = make_perms(moves, len(goal))
+    start = abstract(goal, digits)
+    ranker = MultisetRanker(start)
+    dist = bytearray([UNREACHABLE]) * ranker.size
+    # costs are 0..4, so Dijkstra can keep one bucket per distance
+    best = {start: 0}
+    buckets = [[start]]
+    d = 0
+    while d < len(buckets):
+        # zero cost moves append to the bucket being walked
+        for text in buckets[d]:
+            if best[text] != d:
+                continue
+            r = ranker.rank(text)
+            if dist[r] != UNREACHABLE:
+                continue
+            dist[r] = min(d, UNREACHABLE - 1)
+            for (sp, ep), perm in zip(moves, perms):
+                cost = 4 - (text[sp], text[sp+1], text[ep], text[ep+1]).count(BLANK)
+                ntext = ''.join([text[k] for k in perm])
+                nd = d + cost
+                if nd < best.get(ntext, nd + 1):
+                    best[ntext] = nd
+                    while len(buckets) <= nd:
+                        buckets.append([])
+                    buckets[nd].append(ntext)
+        d += 1
+    return dist
+
+
+class PatternDatabase:
+    """Additive pattern databases of goal, see the module docstring"""
+    def __init__(self, goal: str, size: int=4, directory: str=None):
+        self.goal = goal
+        self.moves = table_moves(len(goal))
+        self.groups = pattern_groups(goal, size)
+        self.built = 0
+        # (digits, ranker of abstract texts, quarter move distances)
+        self.tables = []
+        for digits in self.groups:
+            path = default_pdb_path(goal, digits, directory)
+            ranker = MultisetRanker(abstract(goal, digits))
+            digest = moves_digest(f'{goal}/{digits}', self.moves)
+            dist = self._load(path, digest, ranker.size)
+            if dist is None:
+                dist = build_pattern_table(goal, digits, self.moves)
+                self._save(path, digest, dist)
+                self.built += 1
+            self.tables.append((digits, ranker, dist))
+
+    def heuristic(self, text: str) -> int:
+        total = 0
+        for digits, ranker, dist in self.tables:
+            total += dist[ranker.rank(abstract(text, digits))]
+        return (total + 3) // 4
+
+    def _load(self, path: str, digest: bytes, count: int) -> bytes:
+        """Stored distances, None if the file is missing or was built for something else"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != TABLE_HEADER.size + count:
+            return None
+        header = TABLE_HEADER.unpack_from(data)
+        if header != (PDB_MAGIC, PDB_VERSION, len(self.goal), digest, count):
+            return None
+        return data[TABLE_HEADER.size:]
+
+    def _save(self, path: str, digest: bytes, dist: bytearray):
+        header = TABLE_HEADER.pack(PDB_MAGIC, PDB_VERSION, len(self.goal), digest, len(dist))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(header)
+            f.write(dist)
+        os.replace(path + '.tmp', path)
 
 
 if __name__ == '__main__':
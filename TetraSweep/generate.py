@@ -0,0 +1,77 @@
+"""
+Random TetraSweep instances in the read_from_file format
+
+An n x n board gets random cell values and pieces covering about
+--density of its cells. The pieces are placed first (the planted
+solution), X cells are only put where no planted piece lies and the
+target is the score of the planted placement, so every instance is
+solvable. Files are written as OUT/<size>_<seed>.
+
+  python generate.py cases/generated --sizes 6 7 8 --seeds 3
+"""
+
+import argparse
+import os
+import random
+
+from solve import piece_rotations
+
+
+def generate(size: int, seed: int, density: float=0.4, blocked: float=0.1,
+             low: int=-5, high: int=9) -> str:
+  rnd = random.Random(seed * 1_000_003 + size)
+  free = [[True] * size for _ in range(size)]
+  letters = []
+  wanted = max(1, round(density * size * size / 4))
+  # give up on a piece after this many random placements which do not fit
+  for _ in range(wanted * 50):
+    if len(letters) == wanted:
+      break
+    letter = rnd.choice(sorted(piece_rotations))
+    piece = rnd.choice(piece_rotations[letter])
+    i = rnd.randrange(size - len(piece) + 1)
+    j = rnd.randrange(size - len(piece[0]) + 1)
+    cells = [(i + pi, j + pj) for pi, row in enumerate(piece) for pj, on in enumerate(row) if on]
+    if all(free[ci][cj] for ci, cj in cells):
+      for ci, cj in cells:
+        free[ci][cj] = False
+      letters.append(letter)
+  target = 0
+  rows = []
+  for i in range(size):
+    row = []
+    for j in range(size):
+      if free[i][j] and rnd.random() < blocked:
+        row.append('X')
+        continue
+      value = rnd.randint(low, high)
+      if not free[i][j]:
+        target += value
+      row.append(str(value))
+    rows.append(' '.join(row))
+  rnd.shuffle(letters)
+  return '\n'.join([str(target), ' '.join(letters)] + rows)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('out_dir')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[6, 7, 8], help='board sides')
+  parser.add_argument('--seeds', type=int, default=1, help='instances per size')
+  parser.add_argument('--seed', type=int, default=0, help='first seed')
+  parser.add_argument('--density', type=float, default=0.4,
+                      help='share of the cells covered by the planted pieces')
+  parser.add_argument('--blocked', type=float, default=0.1,
+                      help='chance of an uncovered cell to be X')
+  args = parser.parse_args()
+  os.makedirs(args.out_dir, exist_ok=True)
+  for size in args.sizes:
+    for seed in range(args.seed, args.seed + args.seeds):
+      path = os.path.join(args.out_dir, f'{size}_{seed}')
+      with open(path, 'w') as f:
+        f.write(generate(size, seed, args.density, args.blocked))
+      print(path)
+
+
+if __name__ == '__main__':
+  main()
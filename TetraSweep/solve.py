@@ -1,8 +1,26 @@
+import argparse
+import multiprocessing
+import os
 import sys
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
 from itertools import product
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import (Problem, Progress, add_arguments, no_solution_message, profile_from_args,
+                    progress_from_args, run_from_args)
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
 LOWEST = -1_000_000
+# ranked_placements uses NumPy when it is installed, unless turned off by --no-numpy
+use_numpy = np is not None
+# search loops look at the shared stop flag / best score every SYNC_INTERVAL states
+SYNC_INTERVAL = 256
 
 piece_rotations = {
   'O': [
@@ -47,6 +65,8 @@ class Board:
       self._init_flags()
     else:
       self.flags = flags
+    # flags as NumPy array, see free_grid
+    self._free = None
 
   def available_piece_positions(self, piece) -> list:
     res = []
@@ -56,8 +76,30 @@ class Board:
           res.append((i, j))
     return res
   
+  def __eq__(self, other) -> bool:
+    return self.cells is other.cells and self.occupied_key() == other.occupied_key()
+
+  def __hash__(self) -> int:
+    return hash(self.occupied_key())
+
   def clone(self) -> 'Board':
-    return Board(self.cells, flags=self.flags)
+    nboard = Board(self.cells, flags=self.flags)
+    nboard._free = self._free
+    return nboard
+
+  def free_grid(self):
+    """flags as a NumPy bool array, made once and passed on to the boards place() returns"""
+    if self._free is None:
+      self._free = np.array(self.flags, dtype=bool)
+    return self._free
+
+  def occupied_key(self) -> int:
+    res = 0
+    for i, row in enumerate(self.flags):
+      for j, flag in enumerate(row):
+        if not flag:
+          res |= 1 << (i * len(row) + j)
+    return res
 
   def place(self, piece: list, pos:tuple) -> 'Board':
     i, j = pos
@@ -66,7 +108,12 @@ class Board:
       for pj in range(len(piece[0])):
         if piece[pi][pj]:
           nflags[i+pi][j+pj] = False
-    return Board(self.cells, nflags)
+    nboard = Board(self.cells, nflags)
+    if self._free is not None:
+      nfree = self._free.copy()
+      nfree[i:i+len(piece), j:j+len(piece[0])] &= ~_piece_grid(piece)
+      nboard._free = nfree
+    return nboard
   
   def print(self):
     ctn = []
@@ -118,21 +165,285 @@ class Board:
       self.flags.append(rctn)
 
 
+class BitBoard:
+  """
+  Same interface as Board, but cell (i, j) is bit i * width + j of
+  occupied (placed cells and X cells). Every placement of a rotation is
+  precomputed once per board as shifted mask with its score delta, so
+  placing test is one AND and score is kept incrementally.
+  """
+  def __init__(self, cells: list, occupied: int=None, cur_score: int=0, placements: dict=None):
+    self.cells = cells
+    self._h = len(cells)
+    self._w = len(cells[0])
+    if occupied is None:
+      occupied = 0
+      for i, row in enumerate(cells):
+        for j, cell in enumerate(row):
+          if cell == LOWEST:
+            occupied |= 1 << (i * self._w + j)
+    self.occupied = occupied
+    self._score = cur_score
+    # piece key -> {pos: (mask, score delta)}, shared by all boards from same cells
+    self.placements = {} if placements is None else placements
+
+  @property
+  def flags(self) -> list:
+    res = []
+    for i in range(self._h):
+      base = i * self._w
+      res.append([not self.occupied >> (base + j) & 1 for j in range(self._w)])
+    return res
+
+  def available_piece_positions(self, piece) -> list:
+    occupied = self.occupied
+    res = []
+    for pos, (mask, _) in self._placements_of(piece).items():
+      if not mask & occupied:
+        res.append(pos)
+    return res
+
+  def __eq__(self, other) -> bool:
+    return self.cells is other.cells and self.occupied_key() == other.occupied_key()
+
+  def __hash__(self) -> int:
+    return hash(self.occupied)
+
+  def clone(self) -> 'BitBoard':
+    return BitBoard(self.cells, self.occupied, self._score, self.placements)
+
+  def occupied_key(self) -> int:
+    return self.occupied
+
+  def placement_gains(self, piece: list) -> list:
+    occupied = self.occupied
+    res = []
+    for pos, (mask, delta) in self._placements_of(piece).items():
+      if not mask & occupied:
+        res.append((delta, pos))
+    return res
+
+  def place(self, piece: list, pos: tuple) -> 'BitBoard':
+    mask, delta = self._placements_of(piece)[pos]
+    return BitBoard(self.cells, self.occupied | mask, self._score + delta, self.placements)
+
+  def print(self):
+    Board.print(self)
+
+  def score(self) -> int:
+    return self._score
+
+  def _placements_of(self, piece: list) -> dict:
+    key = tuple(map(tuple, piece))
+    res = self.placements.get(key)
+    if res is not None:
+      return res
+    res = {}
+    ph, pw = len(piece), len(piece[0])
+    cells = [(pi, pj) for pi in range(ph) for pj in range(pw) if piece[pi][pj]]
+    for i in range(self._h - ph + 1):
+      for j in range(self._w - pw + 1):
+        values = [self.cells[i+pi][j+pj] for pi, pj in cells]
+        if LOWEST in values:
+          continue
+        mask = 0
+        for pi, pj in cells:
+          mask |= 1 << ((i + pi) * self._w + j + pj)
+        res[(i, j)] = (mask, sum(values))
+    self.placements[key] = res
+    return res
+
+
+def ranked_placements(board, piece: list) -> list:
+  """Return [(gain, pos)] of every valid placement of piece, best gain first"""
+  if isinstance(board, BitBoard):
+    # gains are precomputed per placement already
+    res = board.placement_gains(piece)
+  elif use_numpy:
+    return _ranked_placements_numpy(board, piece)
+  else:
+    base = board.score()
+    res = []
+    for pos in board.available_piece_positions(piece):
+      res.append((board.place(piece, pos).score() - base, pos))
+  res.sort(key=lambda x: (-x[0], x[1]))
+  return res
+
+
+# id(cells) -> (cells, value grid) and piece key -> mask grid
+_value_grids = {}
+_piece_grids = {}
+
+
+def _ranked_placements_numpy(board, piece: list) -> list:
+  ph, pw = len(piece), len(piece[0])
+  if ph > len(board.cells) or pw > len(board.cells[0]):
+    return []
+  cached = _value_grids.get(id(board.cells))
+  if cached is None or cached[0] is not board.cells:
+    values = np.array(board.cells, dtype=np.int64)
+    values[values == LOWEST] = 0
+    cached = _value_grids[id(board.cells)] = (board.cells, values)
+  values = cached[1]
+  mask = _piece_grid(piece)
+  free = board.free_grid()
+  windows = np.lib.stride_tricks.sliding_window_view
+  valid = np.all(windows(free, (ph, pw)) | ~mask, axis=(2, 3))
+  gains = np.sum(windows(values, (ph, pw)) * mask, axis=(2, 3))
+  rows, cols = np.nonzero(valid)
+  gains = gains[rows, cols]
+  order = np.lexsort((cols, rows, -gains))
+  return [(int(gains[k]), (int(rows[k]), int(cols[k]))) for k in order]
+
+
+def _piece_grid(piece: list):
+  key = tuple(map(tuple, piece))
+  mask = _piece_grids.get(key)
+  if mask is None:
+    mask = _piece_grids[key] = np.array(piece, dtype=bool)
+  return mask
+
+
+class GainTable:
+  """
+  Optimistic score of a state: its score plus, for every letter left,
+  the sum of the k best placement values of that letter on the empty
+  board (k is how many of that letter are left). Placements are taken
+  without looking at overlaps, so it never underestimates.
+  """
+  def __init__(self, board, pletters: list):
+    self.prefix = {}
+    for pl in set(pletters):
+      values = []
+      for pr in piece_rotations[pl]:
+        values.extend(gain for gain, _ in ranked_placements(board, pr))
+      values.sort(reverse=True)
+      prefix = [0]
+      for value in values[:pletters.count(pl)]:
+        prefix.append(prefix[-1] + value)
+      self.prefix[pl] = prefix
+
+  def bound(self, state: 'State') -> int:
+    gain = self.letters_bound(state.pletters)
+    if gain == LOWEST:
+      return LOWEST
+    return state.board.score() + gain
+
+  def letters_bound(self, pletters: list) -> int:
+    res = 0
+    for pl in set(pletters):
+      prefix = self.prefix[pl]
+      count = pletters.count(pl)
+      if count >= len(prefix):
+        # not enough placements for every copy of this letter
+        return LOWEST
+      res += prefix[count]
+    return res
+
+
+class TranspositionTable:
+  """
+  Bounded map from State.key() to best gain the remaining letters can
+  still add (LOWEST if they cannot all be placed). The least recently
+  used entry is evicted when it is full.
+  """
+  def __init__(self, max_entries: int):
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key: tuple) -> int:
+    gain = self.entries.get(key)
+    if gain is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries.move_to_end(key)
+    return gain
+
+  def put(self, key: tuple, gain: int):
+    self.entries[key] = gain
+    self.entries.move_to_end(key)
+    if len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def memory(self) -> int:
+    """Approximate bytes held by the table, keys and values"""
+    res = sys.getsizeof(self.entries)
+    for key, gain in self.entries.items():
+      occupied, letters = key
+      res += sys.getsizeof(key) + sys.getsizeof(occupied) + sys.getsizeof(letters)
+      res += sum(sys.getsizeof(item) for item in letters) + sys.getsizeof(gain)
+    return res
+
+  def report(self):
+    lookups = self.hits + self.misses
+    rate = 100 * self.hits / lookups if lookups else 0
+    print(f'Transposition table: {len(self.entries)} entries, {self.evictions} evicted,',
+          f'hit rate {rate:.1f}% ({self.hits}/{lookups}),',
+          f'memory ~{self.memory() // 1024} KiB')
+
+
 class State:
-  def __init__(self, target: int, board: Board, pletters: list, steps: list=None):
+  """
+  A child points to its parent and keeps only its own placement as move,
+  (letter, rotation index, pos), so states on a stack or queue do not
+  carry copies of the steps before them. steps rebuilds the (piece, pos)
+  list from the parents when a solution is printed. Every state shares
+  the letters tuple of the root, a state at depth d placed the first d
+  of them.
+  """
+  __slots__ = ('target', 'board', 'letters', 'parent', 'move', 'depth', 'last_placement')
+
+  def __init__(self, target: int, board: Board, letters: tuple, parent: 'State'=None,
+               move: tuple=None):
     self.target = target
     self.board = board
-    self.pletters = pletters
-    if steps is None:
-      self.steps = []
-    else:
-      self.steps = steps
+    self.letters = letters
+    self.parent = parent
+    self.move = move
+    self.depth = 0 if parent is None else parent.depth + 1
+    # letter -> (rotation index, pos) of its last placement, only set by step(ordered=True)
+    self.last_placement = None
+
+  @property
+  def pletters(self) -> tuple:
+    """Letters still to place"""
+    return self.letters[self.depth:]
+
+  @property
+  def steps(self) -> list:
+    res = []
+    state = self
+    while state.parent is not None:
+      pl, r, pos = state.move
+      res.append((piece_rotations[pl][r], pos))
+      state = state.parent
+    res.reverse()
+    return res
+
+  def __eq__(self, other) -> bool:
+    return self.key() == other.key()
+
+  def __hash__(self) -> int:
+    return hash(self.key())
+
+  def key(self) -> tuple:
+    """Occupied cells and remaining letters as multiset, order of pletters is ignored"""
+    return (self.board.occupied_key(), tuple(sorted(Counter(self.pletters).items())))
+
+  def dedup_key(self) -> tuple:
+    last = tuple(sorted(self.last_placement.items())) if self.last_placement else ()
+    return (self.board.occupied_key(), self.pletters, last)
 
   def is_finish(self):
-    return len(self.pletters) == 0 and self.board.score() >= self.target
+    return self.depth == len(self.letters) and self.board.score() >= self.target
   
   def is_dead(self):
-    return len(self.pletters) == 0 and self.board.score() < self.target
+    return self.depth == len(self.letters) and self.board.score() < self.target
   
   def is_dead_wannabe(self):
     return self.board.score() < 0
@@ -152,32 +463,156 @@ class State:
       print('========')
     print('================')
   
-  def step(self) -> list:
-    pl = self.pletters.pop(0)
+  def step(self, ordered: bool=False, ranked: bool=False) -> list:
+    """
+    With ordered, copies of the same letter are treated as multiset:
+    each copy must use a greater (rotation index, pos) than the copy
+    placed before it, so only one ordering of the same placements is made.
+    With ranked, children are sorted by placement gain, best one last
+    so it is popped first.
+    """
+    pl = self.letters[self.depth]
     prs = piece_rotations[pl]
+    last = None
+    if ordered:
+      placed = self.last_placement or {}
+      last = placed.get(pl)
+      rest = self.letters[self.depth + 1:]
+    if ranked:
+      moves = []
+      for r, pr in enumerate(prs):
+        for gain, pos in ranked_placements(self.board, pr):
+          moves.append((gain, r, pos))
+      moves.sort()
+      moves = [(r, pos) for _, r, pos in moves]
+    else:
+      moves = []
+      for r, pr in enumerate(prs):
+        moves.extend((r, pos) for pos in self.board.available_piece_positions(pr))
     res = []
-    for pr in prs:
-      av_pos = self.board.available_piece_positions(pr)
-      for pos in av_pos:
-        nboard = self.board.place(pr, pos)
-        nsteps = self.steps + [(pr, pos)]
-        npletters = deepcopy(self.pletters)
-        res.append(State(self.target, nboard, npletters, steps=nsteps))
+    for r, pos in moves:
+      if last is not None and (r, pos) <= last:
+        continue
+      nstate = self.child(r, pos)
+      if ordered:
+        nstate.last_placement = {l: p for l, p in placed.items() if l in rest}
+        if pl in rest:
+          nstate.last_placement[pl] = (r, pos)
+      res.append(nstate)
     return res
 
+  def child(self, r: int, pos: tuple) -> 'State':
+    """The first letter placed in rotation r at pos"""
+    pl = self.letters[self.depth]
+    nboard = self.board.place(piece_rotations[pl][r], pos)
+    return State(self.target, nboard, self.letters, self, (pl, r, pos))
+
+
+class PlacementProblem(Problem):
+  """
+  State on the shared search engine (see search.py at the top of the
+  repo), moves are (piece rotation, pos). States whose bound is below
+  target get no successors. The heuristic is how much the bound fell
+  since the initial state, so greedy and beam keep the states which
+  gave up the fewest points.
+  """
+  def __init__(self, state: State, gains: GainTable):
+    self.state = state
+    self.gains = gains
+    self.best = gains.bound(state)
+
+  def initial(self) -> State:
+    return self.state
+
+  def successors(self, state: State) -> list:
+    if state.depth == len(state.letters) or self.gains.bound(state) < state.target:
+      return []
+    children = state.step(ranked=True)
+    # ranked puts the best gain last
+    children.reverse()
+    return [(child.move, child) for child in children]
+
+  def is_goal(self, state: State) -> bool:
+    return state.is_finish()
+
+  def key(self, state: State) -> tuple:
+    return state.key()
+
+  def heuristic(self, state: State) -> int:
+    return self.best - self.gains.bound(state)
+
 
 def main():
-  if len(sys.argv) != 2:
-    print(f'Usage: python {sys.argv[0]} <input_file_path')
-    quit()
-  state = read_from_file(sys.argv[1])
+  parser = argparse.ArgumentParser()
+  parser.add_argument('input_file_path')
+  parser.add_argument('--backend', choices=['list', 'bitboard'], default='list')
+  parser.add_argument('--mode', choices=['dfs', 'inplace', 'bnb', 'optimize', 'search'],
+                      default='dfs',
+                      help='inplace is dfs placing and removing pieces on one board, '
+                           'bnb cuts states whose bound is below target, '
+                           'optimize finds the maximum score, search runs '
+                           '--strategy of the search engine')
+  parser.add_argument('--dedup', action='store_true',
+                      help='place copies of a letter in one order only and '
+                           'skip states whose occupied cells were seen')
+  parser.add_argument('--no-numpy', action='store_true',
+                      help='rank placements with pure Python even if NumPy is installed')
+  parser.add_argument('--jobs', type=int, default=1,
+                      help='worker processes for root-split search, 0 means CPU count')
+  parser.add_argument('--split-depth', type=int, default=1,
+                      help='pieces placed before subtrees are handed to workers')
+  parser.add_argument('--tt-size', type=int, default=0,
+                      help='optimize with a transposition table of this many entries')
+  add_arguments(parser, default='dfs')
+  args = parser.parse_args()
+  if args.mode == 'search' and args.jobs != 1:
+    parser.error('--mode search runs in one process, drop --jobs')
+  if args.tt_size > 0 and args.jobs != 1:
+    parser.error('--tt-size runs in one process, drop --jobs')
+  if args.no_numpy:
+    global use_numpy
+    use_numpy = False
+  progress = progress_from_args(args)
+  profile_from_args(args, [
+    (State, ('step', 'child', 'is_finish', 'key', 'dedup_key')),
+    (Board, ('available_piece_positions', 'place', 'score')),
+    (BitBoard, ('available_piece_positions', 'placement_gains', 'place', 'score')),
+    (GainTable, ('bound',)),
+    (TranspositionTable, ('get', 'put')),
+    (sys.modules[__name__], ('deepcopy', 'ranked_placements')),
+  ])
+  state = read_from_file(args.input_file_path, args.backend)
   print('Target:', state.target)
-  sol = solve([state])
+  if args.jobs != 1:
+    gains = None if args.mode in ('dfs', 'inplace') else GainTable(state.board, state.pletters)
+    sol = solve_parallel(state, args.mode, gains, args.dedup,
+                         args.jobs or os.cpu_count(), args.split_depth, progress)
+  elif args.mode == 'optimize' and args.tt_size > 0:
+    table = TranspositionTable(args.tt_size)
+    sol = solve_memo(state, table, GainTable(state.board, state.pletters), progress)
+    if progress.verbosity:
+      table.report()
+  elif args.mode == 'dfs':
+    sol = solve([state], args.dedup, progress=progress)
+  elif args.mode == 'inplace':
+    sol = solve_inplace(state, args.dedup, progress=progress)
+  elif args.mode == 'search':
+    node = run_from_args(PlacementProblem(state, GainTable(state.board, state.pletters)), args)
+    sol = None if node is None else node.state
+  else:
+    gains = GainTable(state.board, state.pletters)
+    if args.mode == 'bnb':
+      sol = solve_bnb([state], gains, args.dedup, progress=progress)
+    else:
+      sol = solve_optimize(state, gains, args.dedup, progress=progress)
+  if sol is None:
+    print(no_solution_message(args))
+    return
   print(f'Solution (score: {sol.board.score()})')
   sol.print()
 
 
-def read_from_file(path: str) -> State:
+def read_from_file(path: str, backend: str='list') -> State:
   ctn = open(path).read()
   lines = ctn.split('\n')
   # first line is target
@@ -193,28 +628,328 @@ def read_from_file(path: str) -> State:
       else:
         row.append(int(cell))
     cells.append(row)
-  board = Board(cells)
-  return State(target, board, pieces)
+  if backend == 'bitboard':
+    board = BitBoard(cells)
+  else:
+    board = Board(cells)
+  return State(target, board, tuple(pieces))
 
 
-def solve(q: list) -> State:
-  lsteps = 0
-  processed = 0
+def solve(q: list, dedup: bool=False, stop=None, progress: Progress=None) -> State:
+  if progress is None:
+    progress = Progress()
+  expanded = 0
+  seen = set()
   while q:
+    if stop is not None and expanded % SYNC_INTERVAL == 0 and stop.is_set():
+      return None
     cur = q.pop()
-    if len(cur.steps) > lsteps:
-      print('longest steps:', len(cur.steps))
-      print('current queue:', len(q))
-      lsteps = len(cur.steps)
-    if processed % 100 == 0:
-      print('Has process', processed, 'states')
+    if dedup:
+      key = cur.dedup_key()
+      if key in seen:
+        continue
+      seen.add(key)
+    progress.update(expanded, len(q), cur.depth)
     if cur.is_finish():
+      progress.log('Expanded', expanded, 'states')
       return cur
     if cur.is_dead() or cur.is_dead_wannabe():
-      processed += 1
       continue
-    s = cur.step()
+    expanded += 1
+    s = cur.step(ordered=dedup)
+    q.extend(s)
+  progress.log('Expanded', expanded, 'states')
+
+
+def solve_inplace(state: State, dedup: bool=False, stop=None, progress: Progress=None) -> State:
+  """
+  The search of solve() on one flags grid. A placement clears its cells
+  in place and sets them back when its subtree is done, children are
+  made one at a time in the order solve() pops them, so memory is
+  O(pieces) instead of a copied board for every pushed child. With
+  dedup copies of a letter are placed in one order only (see
+  State.step), there is no seen set.
+  """
+  if progress is None:
+    progress = Progress()
+  cells = state.board.cells
+  h, w = len(cells), len(cells[0])
+  # flat copies, cell (i, j) is i * w + j
+  free = [flag for row in state.board.flags for flag in row]
+  values = [cell for row in cells for cell in row]
+  pletters = state.pletters
+  # (rotation index, pos) of every placed letter
+  path = []
+  last = dict(state.last_placement or {})
+  score = state.board.score()
+  expanded = 0
+  # letter -> rotation -> (anchors in the order solve() pops them, cell offsets)
+  shapes = {}
+  for pl in set(pletters):
+    shapes[pl] = []
+    for pr in piece_rotations[pl]:
+      anchors = [(i, j) for i in reversed(range(h - len(pr) + 1))
+                 for j in reversed(range(w - len(pr[0]) + 1))]
+      offsets = [pi * w + pj for pi, row in enumerate(pr) for pj, on in enumerate(row) if on]
+      shapes[pl].append((anchors, offsets))
+
+  def placements(pl: str):
+    prev = last.get(pl) if dedup else None
+    for r in reversed(range(len(shapes[pl]))):
+      anchors, offsets = shapes[pl][r]
+      for pos in anchors:
+        if prev is not None and (r, pos) <= prev:
+          continue
+        base = pos[0] * w + pos[1]
+        for off in offsets:
+          if not free[base + off]:
+            break
+        else:
+          yield r, pos, [base + off for off in offsets]
+
+  def search(depth: int) -> bool:
+    nonlocal expanded, score
+    if stop is not None and expanded % SYNC_INTERVAL == 0 and stop.is_set():
+      return False
+    progress.update(expanded, None, depth)
+    if depth == len(pletters):
+      return score >= state.target
+    if score < 0:
+      return False
+    expanded += 1
+    pl = pletters[depth]
+    prev = last.get(pl)
+    for r, pos, placed in placements(pl):
+      gain = 0
+      for idx in placed:
+        free[idx] = False
+        gain += values[idx]
+      score += gain
+      path.append((r, pos))
+      last[pl] = (r, pos)
+      if search(depth + 1):
+        return True
+      path.pop()
+      score -= gain
+      for idx in placed:
+        free[idx] = True
+    if prev is None:
+      last.pop(pl, None)
+    else:
+      last[pl] = prev
+    return False
+
+  found = search(0)
+  progress.log('Expanded', expanded, 'states')
+  if not found:
+    return None
+  sol = state
+  for r, pos in path:
+    sol = sol.child(r, pos)
+  return sol
+
+
+def solve_bnb(q: list, gains: GainTable, dedup: bool=False, stop=None,
+              progress: Progress=None) -> State:
+  if progress is None:
+    progress = Progress()
+  processed = 0
+  pruned = 0
+  seen = set()
+  while q:
+    if stop is not None and processed % SYNC_INTERVAL == 0 and stop.is_set():
+      return None
+    cur = q.pop()
+    if dedup:
+      key = cur.dedup_key()
+      if key in seen:
+        continue
+      seen.add(key)
+    processed += 1
+    progress.update(processed, len(q), cur.depth)
+    if cur.is_finish():
+      progress.log('Processed', processed, 'states, pruned', pruned)
+      return cur
+    if cur.is_dead():
+      continue
+    if gains.bound(cur) < cur.target:
+      pruned += 1
+      continue
+    # children come sorted by gain, most promising is popped first
+    s = cur.step(ordered=dedup, ranked=True)
     q.extend(s)
+  progress.log('Processed', processed, 'states, pruned', pruned)
+
+
+def solve_optimize(state: State, gains: GainTable, dedup: bool=False,
+                   shared_best=None, progress: Progress=None) -> State:
+  """shared_best is a multiprocessing.Value holding best score of every worker"""
+  if progress is None:
+    progress = Progress()
+  best = None
+  best_score = LOWEST
+  processed = 0
+  pruned = 0
+  seen = set()
+  q = [state]
+  while q:
+    if shared_best is not None and processed % SYNC_INTERVAL == 0:
+      best_score = max(best_score, shared_best.value)
+    cur = q.pop()
+    if dedup:
+      key = cur.dedup_key()
+      if key in seen:
+        continue
+      seen.add(key)
+    processed += 1
+    progress.update(processed, len(q), cur.depth)
+    if cur.depth == len(cur.letters):
+      if cur.board.score() > best_score:
+        best = cur
+        best_score = cur.board.score()
+        if shared_best is not None:
+          with shared_best.get_lock():
+            shared_best.value = max(shared_best.value, best_score)
+      continue
+    if gains.bound(cur) <= best_score:
+      pruned += 1
+      continue
+    s = cur.step(ordered=dedup, ranked=True)
+    q.extend(s)
+  progress.log('Processed', processed, 'states, pruned', pruned)
+  return best
+
+
+def solve_memo(state: State, table: TranspositionTable, gains: GainTable=None,
+               progress: Progress=None) -> State:
+  """
+  Find the maximum score by computing the best remaining gain of every
+  State.key() once. Different placement orders of the same cells share
+  one table entry. With gains, placements are tried best gain first and
+  the loop stops once gain plus bound of the other letters cannot beat
+  the best found at that state, so every stored gain is still exact.
+  """
+  if progress is None:
+    progress = Progress()
+  computed = 0
+
+  def moves(cur: State) -> list:
+    res = []
+    for r, pr in enumerate(piece_rotations[cur.letters[cur.depth]]):
+      for gain, pos in ranked_placements(cur.board, pr):
+        res.append((gain, r, pos))
+    res.sort(key=lambda m: -m[0])
+    return res
+
+  def rest_bound(cur: State) -> int:
+    if gains is None:
+      return None
+    return gains.letters_bound(cur.letters[cur.depth + 1:])
+
+  def best_gain(cur: State) -> int:
+    nonlocal computed
+    if cur.depth == len(cur.letters):
+      return 0
+    key = cur.key()
+    gain = table.get(key)
+    if gain is not None:
+      return gain
+    gain = LOWEST
+    computed += 1
+    progress.update(computed, len(table.entries), cur.depth)
+    rest = rest_bound(cur)
+    if rest != LOWEST:
+      for mgain, r, pos in moves(cur):
+        if rest is not None and mgain + rest <= gain:
+          break
+        cgain = best_gain(cur.child(r, pos))
+        if cgain != LOWEST:
+          gain = max(gain, mgain + cgain)
+    table.put(key, gain)
+    return gain
+
+  if best_gain(state) == LOWEST:
+    return None
+  cur = state
+  while cur.depth < len(cur.letters):
+    remaining = best_gain(cur)
+    rest = rest_bound(cur)
+    for mgain, r, pos in moves(cur):
+      if rest is not None and mgain + rest < remaining:
+        break
+      nxt = cur.child(r, pos)
+      cgain = best_gain(nxt)
+      if cgain != LOWEST and mgain + cgain == remaining:
+        cur = nxt
+        break
+  return cur
+
+
+# set in every worker by _init_worker
+_stop = None
+_shared_best = None
+
+
+def _init_worker(stop, shared_best):
+  global _stop, _shared_best
+  _stop = stop
+  _shared_best = shared_best
+
+
+def _solve_subtree(state: State, mode: str, gains: GainTable, dedup: bool,
+                   progress: Progress) -> State:
+  if mode == 'optimize':
+    return solve_optimize(state, gains, dedup, _shared_best, progress)
+  if mode == 'bnb':
+    sol = solve_bnb([state], gains, dedup, _stop, progress)
+  elif mode == 'inplace':
+    sol = solve_inplace(state, dedup, _stop, progress)
+  else:
+    sol = solve([state], dedup, _stop, progress)
+  if sol is not None:
+    _stop.set()
+  return sol
+
+
+def solve_parallel(state: State, mode: str, gains: GainTable, dedup: bool,
+                   jobs: int, depth: int, progress: Progress=None) -> State:
+  """
+  Expand the root down to depth placed pieces and solve every subtree
+  in a worker process. In dfs/bnb the first worker that finishes sets
+  the shared stop flag, in optimize workers share the best score.
+  """
+  frontier = [state]
+  for _ in range(depth):
+    nfrontier = []
+    for cur in frontier:
+      if cur.depth == len(cur.letters):
+        nfrontier.append(cur)
+      else:
+        nfrontier.extend(cur.step(ordered=dedup, ranked=gains is not None))
+    frontier = nfrontier
+  if progress is None:
+    progress = Progress()
+  progress.log('Split into', len(frontier), 'subtrees on', jobs, 'workers')
+  stop = multiprocessing.Event()
+  shared_best = multiprocessing.Value('q', LOWEST)
+  best = None
+  with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                           initargs=(stop, shared_best)) as executor:
+    # most promising subtrees were generated last
+    futures = [executor.submit(_solve_subtree, sub, mode, gains, dedup, progress)
+               for sub in reversed(frontier)]
+    for future in as_completed(futures):
+      sol = future.result()
+      if sol is None:
+        continue
+      if mode != 'optimize':
+        best = sol
+        for f in futures:
+          f.cancel()
+        break
+      if best is None or sol.board.score() > best.board.score():
+        best = sol
+  return best
 
 
 if __name__ == '__main__':
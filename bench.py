@@ -0,0 +1,299 @@
+"""
+Benchmark every solver on every bundled case
+
+Every run is a fresh `python script args --quiet --stats-json FILE`
+subprocess started in the directory of the script, so imports, caches
+and memory of one run never leak into the next. The wall time is taken
+around the subprocess, nodes, peak frontier and peak RSS are what the
+solver's Progress wrote to FILE (see search.py). Each case runs --repeat
+times, the minimum time is compared (it is the least noisy one) and the
+median is kept for reference.
+
+  python bench.py --save            write the baseline, with -k only the
+                                    matching cases are replaced
+  python bench.py                   compare with the baseline, exit 1
+                                    if a case got slower, expanded more
+                                    nodes or used more memory by more
+                                    than --threshold (0.2 means 20%)
+  python bench.py -k flow --list    only cases whose name matches
+  python bench.py --scaling         generated instances of growing size
+
+--scaling writes --seeds instances per size with the generator of every
+game, runs each solver on them from the smallest size up and prints the
+median per size. A solver stops at the first size where a run fails or
+hits --timeout, which is where that engine falls over. --scaling-json
+keeps the series for plotting, they are not compared with the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(ROOT, 'bench_baseline.json')
+# metrics compared with the baseline, nodes and rss are left out when a solver does not report them
+COMPARED = ('time', 'nodes', 'rss')
+
+# directory -> list of (solver name, arguments); {case} is a file of directory/cases
+CASE_SOLVERS = {
+  'TetraSweep': [
+    ('bnb', ['solve.py', '{case}', '--backend', 'bitboard', '--mode', 'bnb']),
+    ('memo', ['solve.py', '{case}', '--backend', 'bitboard', '--mode', 'optimize',
+              '--tt-size', '100000']),
+    ('inplace', ['solve.py', '{case}', '--mode', 'inplace']),
+  ],
+  'flow': [
+    ('cp', ['solve.py', '{case}']),
+    ('sat', ['solve.py', '{case}', '--solver', 'sat']),
+    ('inplace', ['solve.py', '{case}', '--solver', 'inplace']),
+  ],
+  'fillomino': [
+    ('solve', ['solve.py', '{case}']),
+  ],
+}
+# the 100 Doors levels are hard coded, {tmp} is a directory kept for the whole run
+LEVELS = [
+  ('level_045/state', ['level_045.py']),
+  ('level_045/bitmask', ['level_045.py', '--engine', 'bitmask']),
+  ('level_045/astar', ['level_045.py', '--engine', 'search', '--strategy', 'astar']),
+  ('level_074/board', ['level_074.py']),
+  ('level_074/board-unsolvable', ['level_074.py', '--level', 'cases/074_unsolvable']),
+  ('level_074/bitboard', ['level_074.py', '--engine', 'bitboard', '--prune']),
+  ('level_074/inplace', ['level_074.py', '--engine', 'inplace']),
+  ('level_074/search', ['level_074.py', '--engine', 'search', '--prune']),
+  ('level_110/bidir', ['level_110.py', '--mode', 'bidir']),
+  ('level_110/bidir-unreachable', ['level_110.py', '1234', '2143', '--mode', 'bidir']),
+  ('level_110/astar', ['level_110.py', '--mode', 'search', '--strategy', 'astar',
+                       '--pdb-dir', '{tmp}']),
+]
+# directory -> (generator, sizes, list of (solver name, arguments)); {case} is a generated file
+SCALING = {
+  'TetraSweep': ('generate.py', [5, 6, 7, 8, 9, 10], [
+    ('bnb', ['solve.py', '{case}', '--backend', 'bitboard', '--mode', 'bnb']),
+    ('memo', ['solve.py', '{case}', '--backend', 'bitboard', '--mode', 'optimize',
+              '--tt-size', '100000']),
+  ]),
+  'flow': ('generate.py', [6, 8, 10, 12, 14], [
+    ('cp', ['solve.py', '{case}']),
+    ('sat', ['solve.py', '{case}', '--solver', 'sat']),
+  ]),
+  'fillomino': ('generate.py', [10, 15, 20, 25, 30], [
+    ('solve', ['solve.py', '{case}']),
+  ]),
+  '100 Doors Challenge': ('generate_074.py', [5, 7, 9, 11, 13], [
+    ('level_074/board', ['level_074.py', '--prune', '--level', '{case}']),
+    ('level_074/bitboard', ['level_074.py', '--engine', 'bitboard', '--prune',
+                            '--level', '{case}']),
+  ]),
+}
+
+
+def collect_cases() -> list:
+  """(name, directory, arguments) of every benchmark"""
+  res = []
+  for directory, solvers in CASE_SOLVERS.items():
+    cases_dir = os.path.join(ROOT, directory, 'cases')
+    for case in sorted(os.listdir(cases_dir)):
+      if not os.path.isfile(os.path.join(cases_dir, case)):
+        continue
+      for solver, args in solvers:
+        args = [arg.replace('{case}', os.path.join('cases', case)) for arg in args]
+        res.append((f'{directory}/{case}/{solver}', directory, args))
+  for name, args in LEVELS:
+    res.append((name, '100 Doors Challenge', args))
+  return res
+
+
+def run_once(directory: str, args: list, timeout: float) -> dict:
+  fd, stats_path = tempfile.mkstemp(suffix='.json')
+  os.close(fd)
+  try:
+    cmd = [sys.executable] + args + ['--quiet', '--stats-json', stats_path]
+    start_time = time.perf_counter()
+    try:
+      proc = subprocess.run(cmd, cwd=os.path.join(ROOT, directory), timeout=timeout,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except subprocess.TimeoutExpired:
+      return {'error': f'timeout after {timeout} seconds'}
+    elapsed = time.perf_counter() - start_time
+    if proc.returncode != 0:
+      lines = proc.stderr.decode(errors='replace').strip().split('\n')
+      return {'error': f'exit code {proc.returncode}: {lines[-1]}'}
+    with open(stats_path) as f:
+      stats = json.load(f)
+  finally:
+    os.remove(stats_path)
+  return {
+    'time': elapsed,
+    'nodes': stats['nodes'] or None,
+    'frontier': stats['max_frontier'] or None,
+    'rss': stats['peak_rss'],
+  }
+
+
+def run_case(directory: str, args: list, repeat: int, timeout: float) -> dict:
+  runs = []
+  for _ in range(repeat):
+    res = run_once(directory, args, timeout)
+    if 'error' in res:
+      return res
+    runs.append(res)
+  times = [r['time'] for r in runs]
+  return {
+    'time': min(times),
+    'time_median': statistics.median(times),
+    # the solvers are deterministic, the last run has the warm caches of the others
+    'nodes': runs[-1]['nodes'],
+    'frontier': runs[-1]['frontier'],
+    'rss': max(r['rss'] for r in runs) if runs[-1]['rss'] is not None else None,
+  }
+
+
+def run_scaling(pattern: str, seeds: int, timeout: float, tmp: str) -> dict:
+  """name -> list of per size results, printed as they come"""
+  res = {}
+  for directory, (generator, sizes, solvers) in SCALING.items():
+    solvers = [(solver, args) for solver, args in solvers
+               if not pattern or re.search(pattern, f'{directory}/{solver}')]
+    if not solvers:
+      continue
+    out_dir = os.path.join(tmp, directory)
+    cmd = [sys.executable, generator, out_dir, '--seeds', str(seeds), '--sizes']
+    subprocess.run(cmd + [str(size) for size in sizes], cwd=os.path.join(ROOT, directory),
+                   stdout=subprocess.DEVNULL, check=True)
+    for solver, args in solvers:
+      name = f'{directory}/{solver}' if '/' not in solver else solver
+      series = res[name] = []
+      for size in sizes:
+        runs = []
+        for seed in range(seeds):
+          case = os.path.join(out_dir, f'{size}_{seed}')
+          run = run_once(directory, [arg.replace('{case}', case) for arg in args], timeout)
+          if 'error' in run:
+            series.append({'size': size, 'seed': seed, 'error': run['error']})
+            break
+          runs.append(run)
+        else:
+          point = {'size': size}
+          for metric in ('time', 'nodes', 'rss'):
+            values = [run[metric] for run in runs if run[metric] is not None]
+            point[metric] = statistics.median(values) if values else None
+          series.append(point)
+          print(f'{name} size {size}: {format_point(point)}', flush=True)
+          continue
+        print(f'{name} size {size}: seed {seed}: {run["error"]}, larger sizes skipped', flush=True)
+        break
+  return res
+
+
+def format_point(point: dict) -> str:
+  parts = [f'{point["time"]:.3f}s']
+  if point['nodes'] is not None:
+    parts.append(f'nodes: {point["nodes"]:.0f}')
+  if point['rss'] is not None:
+    parts.append(f'rss: {point["rss"] / 2 ** 20:.1f} MB')
+  return ' '.join(parts) + ' (median)'
+
+
+def compare(result: dict, base: dict, threshold: float) -> list:
+  """Metrics of result worse than base by more than threshold"""
+  res = []
+  for metric in COMPARED:
+    new = result.get(metric)
+    old = base.get(metric)
+    if new is None or old is None or old <= 0:
+      continue
+    if new > old * (1 + threshold):
+      res.append(f'{metric} +{(new / old - 1) * 100:.0f}%')
+  return res
+
+
+def format_result(res: dict) -> str:
+  if 'error' in res:
+    return res['error']
+  parts = [f'{res["time"]:.3f}s (median {res["time_median"]:.3f}s)']
+  for metric in ('nodes', 'frontier'):
+    if res[metric] is not None:
+      parts.append(f'{metric}: {res[metric]}')
+  if res['rss'] is not None:
+    parts.append(f'rss: {res["rss"] / 2 ** 20:.1f} MB')
+  return ' '.join(parts)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-k', dest='pattern', help='only cases whose name matches this regex')
+  parser.add_argument('--list', action='store_true', help='list the cases and exit')
+  parser.add_argument('--repeat', type=int, default=3, help='runs of every case')
+  parser.add_argument('--timeout', type=float, default=300, help='seconds per run')
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON path')
+  parser.add_argument('--save', action='store_true',
+                      help='write the successful results into the baseline')
+  parser.add_argument('--threshold', type=float, default=0.2,
+                      help='allowed regression as a fraction of the baseline')
+  parser.add_argument('--scaling', action='store_true',
+                      help='run the solvers on generated instances of growing size')
+  parser.add_argument('--seeds', type=int, default=3, help='scaling instances per size')
+  parser.add_argument('--scaling-json', metavar='PATH', help='write the scaling series to PATH')
+  args = parser.parse_args()
+  if args.scaling:
+    with tempfile.TemporaryDirectory() as tmp:
+      series = run_scaling(args.pattern, args.seeds, args.timeout, tmp)
+    if args.scaling_json:
+      with open(args.scaling_json, 'w') as f:
+        json.dump(series, f, indent=2)
+    return
+  cases = collect_cases()
+  if args.pattern:
+    cases = [case for case in cases if re.search(args.pattern, case[0])]
+  if args.list:
+    for name, directory, cargs in cases:
+      print(name, '->', directory, ' '.join(cargs))
+    return
+
+  baseline = {}
+  if os.path.exists(args.baseline):
+    with open(args.baseline) as f:
+      baseline = json.load(f)['cases']
+  results = {}
+  failed = []
+  with tempfile.TemporaryDirectory() as tmp:
+    for name, directory, cargs in cases:
+      cargs = [arg.replace('{tmp}', tmp) for arg in cargs]
+      res = run_case(directory, cargs, args.repeat, args.timeout)
+      results[name] = res
+      line = f'{name}: {format_result(res)}'
+      if 'error' in res:
+        failed.append(name)
+      elif name in baseline and not args.save:
+        worse = compare(res, baseline[name], args.threshold)
+        if worse:
+          failed.append(name)
+          line += ' REGRESSION ' + ', '.join(worse)
+      print(line, flush=True)
+
+  if args.save:
+    # only the cases which ran and succeeded replace their entries, -k keeps the others
+    saved = [name for name, res in results.items() if 'error' not in res]
+    for name in saved:
+      baseline[name] = results[name]
+    with open(args.baseline, 'w') as f:
+      json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                 'repeat': args.repeat, 'cases': baseline}, f, indent=2, sort_keys=True)
+    print(f'Baseline written to {args.baseline} ({len(saved)} of {len(baseline)} cases updated)')
+  elif not baseline:
+    print('No baseline at', args.baseline, 'run with --save first')
+  if failed:
+    print('Failed:', ', '.join(failed))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
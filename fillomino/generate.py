@@ -0,0 +1,96 @@
+"""
+Random fillomino grids in the read_from_file format
+
+The n x n grid is first split into regions (the planted solution): cells
+are visited row by row and every cell not yet in a region grows a new
+region of a random size up to --max-value, retrying other sizes when
+the region cannot grow that far or would touch a region of the same
+size. Every cell then keeps its number as a clue with chance --clues
+(and at least one cell of the largest region does), the others become
+'_'. Files are written as OUT/<size>_<seed>.
+
+  python generate.py cases/generated --sizes 10 15 20 --seeds 3
+"""
+
+import argparse
+import os
+import random
+
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def partition(size: int, max_value: int, rnd: random.Random) -> list:
+  """Region size of every cell, None if the greedy split got stuck"""
+  region = [[-1] * size for _ in range(size)]
+  sizes = []
+
+  def neighbors(cells: list) -> list:
+    return [(i + di, j + dj) for i, j in cells for di, dj in DIRECTIONS
+            if 0 <= i + di < size and 0 <= j + dj < size]
+
+  for i in range(size):
+    for j in range(size):
+      if region[i][j] >= 0:
+        continue
+      label = len(sizes)
+      for value in rnd.sample(range(1, max_value + 1), max_value):
+        cells = [(i, j)]
+        region[i][j] = label
+        while len(cells) < value:
+          frontier = [(a, b) for a, b in neighbors(cells) if region[a][b] < 0]
+          if not frontier:
+            break
+          a, b = rnd.choice(frontier)
+          region[a][b] = label
+          cells.append((a, b))
+        touching = {region[a][b] for a, b in neighbors(cells)} - {-1, label}
+        if len(cells) == value and all(sizes[other] != value for other in touching):
+          sizes.append(value)
+          break
+        for a, b in cells:
+          region[a][b] = -1
+      else:
+        return None
+  return [[sizes[label] for label in row] for row in region]
+
+
+def generate(size: int, seed: int, max_value: int=6, clues: float=0.45) -> str:
+  rnd = random.Random(seed * 1_000_003 + size)
+  values = None
+  while values is None:
+    values = partition(size, max_value, rnd)
+  shown = [[rnd.random() < clues for _ in row] for row in values]
+  # the solver takes the largest clue as largest value, give the largest region away
+  top = max(max(row) for row in values)
+  if not any(shown[i][j] for i, row in enumerate(values) for j, value in enumerate(row)
+             if value == top):
+    i, j = rnd.choice([(i, j) for i, row in enumerate(values)
+                       for j, value in enumerate(row) if value == top])
+    shown[i][j] = True
+  rows = []
+  for row, flags in zip(values, shown):
+    rows.append(''.join(str(value) if flag else '_' for value, flag in zip(row, flags)))
+  return '\n'.join(rows)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('out_dir')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10, 15, 20], help='grid sides')
+  parser.add_argument('--seeds', type=int, default=1, help='instances per size')
+  parser.add_argument('--seed', type=int, default=0, help='first seed')
+  parser.add_argument('--max-value', type=int, default=6, choices=range(1, 10),
+                      metavar='1-9', help='largest region')
+  parser.add_argument('--clues', type=float, default=0.45, help='share of cells given')
+  args = parser.parse_args()
+  os.makedirs(args.out_dir, exist_ok=True)
+  for size in args.sizes:
+    for seed in range(args.seed, args.seed + args.seeds):
+      path = os.path.join(args.out_dir, f'{size}_{seed}')
+      with open(path, 'w') as f:
+        f.write(generate(size, seed, args.max_value, args.clues))
+      print(path)
+
+
+if __name__ == '__main__':
+  main()
@@ -1,5 +1,10 @@
+import argparse
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import Progress, add_progress_arguments, profile_from_args, progress_from_args
+
 
 class State:
   def __init__(self, cells: list):
@@ -7,85 +12,335 @@ class State:
     self.highest = 0
     for row in cells:
       for cell in row:
-        if cell.isnum() and int(cell) > self.highest:
+        if cell.isdigit() and int(cell) > self.highest:
           self.highest = int(cell)
-  
-  def is_valid_until_pos(self, pos: tuple) -> False:
-    pi, pj = pos
-    for i in range(pi + 1):
-      for j in range(len(self.cells[0])):
-        if j > pj:
-          break
-        num = self.cells[i][j]
-        if self._count_adjacencies((i, j)) > num:
-          return False
-    return True
 
   def print(self):
     for row in self.cells:
       print(''.join(row))
-  
-  def solve(self) -> bool:
-    values = list(range(self.highest + 1))
-    return True
-    
-  def _count_adjacencies(self, pos: tuple):
-    pi, pj = pos
-    num = self.cells[pi][pj]
-    ls = [pos]
-    total = 0
-    while ls:
-      cur = ls.pop(0)
-      i, j = cur
-      if self.cells[i][j] == num:
-        total +=1
-        ls.extend(self._neighbors(cur))
-    return total
-  
+
   def _neighbors(self, pos: tuple) -> list:
     i, j = pos
     res = []
-    for di in [-1, 0, 1]:
-      for dj in [-1, 0, 1]:
-        if di == 0 and dj == 0:
-          continue
-        ni, nj = i + di, j + dj
-        if self._valid_pos((ni, nj)):
-          res.append((ni, nj))
-    return pos
-  
-  def _solve_util(self, pos: tuple):
-    i, j = pos
-    
-  
+    for di, dj in [(-1, 0), (0, -1), (0, 1), (1, 0)]:
+      ni, nj = i + di, j + dj
+      if self._valid_pos((ni, nj)):
+        res.append((ni, nj))
+    return res
+
   def _valid_pos(self, pos: tuple) -> bool:
     i, j = pos
     return i >= 0 and j >= 0 and i < len(self.cells) and j < len(self.cells[0])
 
 
+# trail entries of Solver, undone in reverse order
+_CANDS, _ASSIGN, _UNION = range(3)
+
+
+class Solver:
+  """
+  Cells are flat (i * w + j) and hold their number, 0 means unknown.
+  Every unknown cell keeps a bitmask of numbers it may still take.
+  Known cells are joined with same-numbered neighbors in a union-find
+  (union by size, no path compression so a union can be undone) and
+  every root keeps the list of its cells, so a region and its size are
+  at hand as cells are assigned. Every change goes on a trail and a
+  failed branch undoes the trail back to where it started, nothing is
+  copied.
+
+  propagate() takes cells from a queue of cells whose neighborhood
+  changed until it is empty:
+  - a complete region (size == number) seals its border: no neighbor
+    may take that number
+  - an incomplete region which can only grow through one cell takes it
+  - a region (or a number of an unknown cell) whose reachable space is
+    smaller than the number is a contradiction
+  - a number that would merge neighbors beyond their size is removed
+  - an unknown cell with one number left takes it
+  Search grows the incomplete region with the fewest options relative to
+  how often it failed before, or starts a new region in the unknown cell
+  with the fewest numbers left. Runs restart with a growing node budget.
+  """
+  def __init__(self, state: State, max_value: int=None):
+    self.h = len(state.cells)
+    self.w = len(state.cells[0])
+    self.n = self.h * self.w
+    self.neighbors = []
+    for idx in range(self.n):
+      pos = divmod(idx, self.w)
+      self.neighbors.append([i * self.w + j for i, j in state._neighbors(pos)])
+    self.max_value = max_value or max(state.highest, 1)
+    self.clues = []
+    for row in state.cells:
+      for cell in row:
+        self.clues.append(int(cell) if cell.isdigit() else 0)
+    self.nodes = 0
+    self.progress = None
+    self.restarts = 0
+    self.limit = None
+    # cells of regions that caused contradictions, searched first later on
+    self.weights = [1] * self.n
+
+  def solve(self, restart_first: int=100, restart_inc: float=1.5) -> list:
+    everything = (1 << (self.max_value + 1)) - 2
+    self.values = [0] * self.n
+    self.cands = [everything] * self.n
+    self.parent = list(range(self.n))
+    self.size = [1] * self.n
+    self.members = [[x] for x in range(self.n)]
+    # roots of the known regions
+    self.roots = set()
+    self.trail = []
+    self.dirty = set()
+    for idx, value in enumerate(self.clues):
+      if value and not self._assign(idx, value):
+        return None
+    base = len(self.trail)
+    # an early mistake can take long to refute, restart with a growing
+    # node budget and keep the weights so the next run branches elsewhere
+    budget = restart_first
+    while True:
+      self.limit = self.nodes + budget
+      self.dirty = set(range(self.n))
+      res = self._search()
+      if res is not None or self.nodes <= self.limit:
+        return res
+      self._undo(base)
+      self.restarts += 1
+      budget *= restart_inc
+
+  def _find(self, x: int) -> int:
+    parent = self.parent
+    while parent[x] != x:
+      x = parent[x]
+    return x
+
+  def _touch(self, x: int):
+    self.dirty.add(x)
+    self.dirty.update(self.neighbors[x])
+
+  def _set_cands(self, x: int, cands: int):
+    self.trail.append((_CANDS, x, self.cands[x]))
+    self.cands[x] = cands
+    self._touch(x)
+
+  def _assign(self, x: int, value: int) -> bool:
+    values, parent, size, members = self.values, self.parent, self.size, self.members
+    self.trail.append((_ASSIGN, x, self.cands[x]))
+    values[x] = value
+    self.cands[x] = 0
+    self.roots.add(x)
+    self._touch(x)
+    for n in self.neighbors[x]:
+      if values[n] != value:
+        continue
+      rx = self._find(x)
+      rn = self._find(n)
+      if rx == rn:
+        continue
+      if size[rx] < size[rn]:
+        rx, rn = rn, rx
+      parent[rn] = rx
+      size[rx] += size[rn]
+      members[rx].extend(members[rn])
+      self.roots.discard(rn)
+      self.trail.append((_UNION, rx, rn))
+      if size[rx] > value:
+        return False
+    return True
+
+  def _undo(self, mark: int):
+    values, cands, parent, size, members = (self.values, self.cands, self.parent,
+                                            self.size, self.members)
+    trail = self.trail
+    while len(trail) > mark:
+      kind, x, old = trail.pop()
+      if kind == _CANDS:
+        cands[x] = old
+      elif kind == _ASSIGN:
+        values[x] = 0
+        cands[x] = old
+        self.roots.discard(x)
+      else:
+        # x absorbed the region of old at the end of its cell list
+        parent[old] = old
+        size[x] -= size[old]
+        del members[x][len(members[x]) - len(members[old]):]
+        self.roots.add(old)
+    # the queue only held cells of the undone changes
+    self.dirty.clear()
+
+  def _room(self, cells: list, value: int) -> bool:
+    """Whether cells can reach value cells through unknown/same-numbered cells"""
+    values, cands = self.values, self.cands
+    bit = 1 << value
+    seen = set(cells)
+    stack = list(cells)
+    while stack:
+      cur = stack.pop()
+      for n in self.neighbors[cur]:
+        if n in seen:
+          continue
+        if values[n] == value or (values[n] == 0 and cands[n] & bit):
+          seen.add(n)
+          if len(seen) >= value:
+            return True
+          stack.append(n)
+    return len(seen) >= value
+
+  def _frontier(self, root: int) -> set:
+    values, cands = self.values, self.cands
+    bit = 1 << values[root]
+    return {n for c in self.members[root] for n in self.neighbors[c]
+            if values[n] == 0 and cands[n] & bit}
+
+  def _propagate(self) -> bool:
+    dirty = self.dirty
+    while dirty:
+      x = dirty.pop()
+      if self.values[x]:
+        ok = self._check_region(self._find(x))
+      else:
+        ok = self._check_cell(x)
+      if not ok:
+        dirty.clear()
+        return False
+    return True
+
+  def _check_region(self, root: int) -> bool:
+    value = self.values[root]
+    cells = self.members[root]
+    # one check covers every queued cell of the region
+    self.dirty.difference_update(cells)
+    frontier = self._frontier(root)
+    if self.size[root] == value:
+      bit = 1 << value
+      for f in frontier:
+        self._set_cands(f, self.cands[f] & ~bit)
+        if not self.cands[f]:
+          return False
+      return True
+    if not frontier or not self._room(cells, value):
+      for c in cells:
+        self.weights[c] += 1
+      return False
+    if len(frontier) == 1:
+      return self._assign(frontier.pop(), value)
+    return True
+
+  def _check_cell(self, x: int) -> bool:
+    values, size = self.values, self.size
+    around = {}
+    for n in self.neighbors[x]:
+      if values[n]:
+        around.setdefault(values[n], set()).add(self._find(n))
+    cands = self.cands[x]
+    for value in range(1, self.max_value + 1):
+      bit = 1 << value
+      if not cands & bit:
+        continue
+      merged = 1 + sum(size[r] for r in around.get(value, ()))
+      if merged > value or (merged < value and not self._room([x], value)):
+        cands &= ~bit
+    if cands != self.cands[x]:
+      self._set_cands(x, cands)
+    if not cands:
+      self.weights[x] += 1
+      return False
+    if cands & (cands - 1) == 0:
+      return self._assign(x, cands.bit_length() - 1)
+    return True
+
+  def _search(self) -> list:
+    values, cands, size = self.values, self.cands, self.size
+    while True:
+      self.nodes += 1
+      if self.progress is not None:
+        self.progress.update(self.nodes)
+      if self.nodes > self.limit or not self._propagate():
+        return None
+      if 0 not in values:
+        if all(size[r] == values[r] for r in self.roots):
+          return list(values)
+        return None
+      # grow the incomplete region with the fewest options which failed most
+      best = None
+      for root in sorted(self.roots):
+        value = values[root]
+        if size[root] == value:
+          continue
+        frontier = self._frontier(root)
+        score = len(frontier) / sum(self.weights[c] for c in self.members[root])
+        if best is None or score < best[2]:
+          best = (value, frontier, score)
+      if best is None:
+        break
+      # either the cell joins the region or it never takes that number
+      value, frontier, _ = best
+      cell = min(frontier)
+      mark = len(self.trail)
+      if self._assign(cell, value):
+        res = self._search()
+        if res is not None:
+          return res
+      self._undo(mark)
+      self._set_cands(cell, cands[cell] & ~(1 << value))
+    # only unclued regions are left, start one in the most constrained cell
+    cell = min((x for x in range(self.n) if not values[x]),
+               key=lambda x: bin(cands[x]).count('1'))
+    for value in range(1, self.max_value + 1):
+      if cands[cell] >> value & 1:
+        mark = len(self.trail)
+        if self._assign(cell, value):
+          res = self._search()
+          if res is not None:
+            return res
+        self._undo(mark)
+    return None
+
+
 def main():
-  if len(sys.argv) != 2:
-    print('Usage: python solve.py <input_file_path>')
+  parser = argparse.ArgumentParser()
+  parser.add_argument('input_file_path')
+  parser.add_argument('--max-value', type=int,
+                      help='largest number a cell may take (default: largest clue)')
+  add_progress_arguments(parser)
+  args = parser.parse_args()
+  start_state = read_from_file(args.input_file_path)
+  progress = progress_from_args(args)
+  profile_from_args(args, [
+    (Solver, ('_propagate', '_check_region', '_check_cell', '_assign', '_room', '_undo')),
+  ])
+  sol = solve(start_state, args.max_value, progress)
+  if sol is None:
+    print('No solution')
     quit(1)
-  start_state = read_from_file(sys.argv[1])
-  sol = solve(start_state)
   print('Solution:')
   sol.print()
 
 
 def read_from_file(path: str) -> State:
   cells = []
-  lines = open(path).read().split('\n')
+  lines = open(path).read().strip().split('\n')
   for line in lines:
     rc = []
-    for c in line:
+    for c in line.strip():
       rc.append(c)
     cells.append(rc)
   return State(cells)
 
 
-def solve(state: State) -> State:
-  return state
+def solve(state: State, max_value: int=None, progress: Progress=None) -> State:
+  solver = Solver(state, max_value)
+  solver.progress = Progress() if progress is None else progress
+  values = solver.solve()
+  solver.progress.log('Nodes:', solver.nodes, 'restarts:', solver.restarts)
+  if values is None:
+    return None
+  cells = []
+  for i in range(solver.h):
+    cells.append([str(v) for v in values[i * solver.w:(i + 1) * solver.w]])
+  return State(cells)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+"""
+Random Flow grids in the read_from_file format
+
+A Hamiltonian path over the n x n grid is randomized with backbite moves
+(join an end of the path to one of its grid neighbors and reverse the
+part after it) and cut into segments of at least --min-length cells.
+Each segment is a color, its two end cells are the endpoints, so the
+segments are a planted solution which fills every cell. Files are
+written as OUT/<size>_<seed>.
+
+  python generate.py cases/generated --sizes 8 10 12 --seeds 3
+"""
+
+import argparse
+import os
+import random
+
+COLORS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def hamiltonian_path(size: int, rnd: random.Random, moves: int) -> list:
+  # serpentine start, cells as (i, j)
+  path = [(i, j if i % 2 == 0 else size - 1 - j) for i in range(size) for j in range(size)]
+  index = {cell: k for k, cell in enumerate(path)}
+  for _ in range(moves):
+    if rnd.random() < 0.5:
+      path.reverse()
+      index = {cell: k for k, cell in enumerate(path)}
+    i, j = path[-1]
+    nbors = [(i + di, j + dj) for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1))
+             if 0 <= i + di < size and 0 <= j + dj < size]
+    k = index[rnd.choice(nbors)]
+    if k == len(path) - 2:
+      continue
+    tail = path[k + 1:]
+    tail.reverse()
+    path[k + 1:] = tail
+    for n, cell in enumerate(tail, k + 1):
+      index[cell] = n
+  return path
+
+
+def cut(length: int, count: int, min_length: int, rnd: random.Random) -> list:
+  """count random segment lengths adding up to length, at least min_length each"""
+  lengths = [min_length] * count
+  for _ in range(length - min_length * count):
+    lengths[rnd.randrange(count)] += 1
+  return lengths
+
+
+def generate(size: int, seed: int, min_length: int=3) -> str:
+  rnd = random.Random(seed * 1_000_003 + size)
+  path = hamiltonian_path(size, rnd, 20 * size * size)
+  cells = [['_'] * size for _ in range(size)]
+  # about one color per row like the hand made levels, but never more than letters
+  count = max(1, min(len(COLORS), size + rnd.randint(-1, 1), len(path) // min_length))
+  start = 0
+  for color, length in zip(COLORS, cut(len(path), count, min_length, rnd)):
+    for i, j in (path[start], path[start + length - 1]):
+      cells[i][j] = color
+    start += length
+  return '\n'.join(''.join(row) for row in cells)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('out_dir')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[8, 10, 12], help='grid sides')
+  parser.add_argument('--seeds', type=int, default=1, help='instances per size')
+  parser.add_argument('--seed', type=int, default=0, help='first seed')
+  parser.add_argument('--min-length', type=int, default=3, help='fewest cells of a path')
+  args = parser.parse_args()
+  os.makedirs(args.out_dir, exist_ok=True)
+  for size in args.sizes:
+    for seed in range(args.seed, args.seed + args.seeds):
+      path = os.path.join(args.out_dir, f'{size}_{seed}')
+      with open(path, 'w') as f:
+        f.write(generate(size, seed, args.min_length))
+      print(path)
+
+
+if __name__ == '__main__':
+  main()
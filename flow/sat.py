@@ -0,0 +1,266 @@
+"""
+Small pure-Python CDCL SAT solver and DIMACS helpers
+
+Clauses use DIMACS literals: variable v is v and its negation is -v.
+Inside the solver literal of variable v is 2 * (v - 1) and its
+negation is that plus 1, so negating a literal is l ^ 1.
+
+The solver uses two watched literals for unit propagation, first UIP
+conflict analysis with non-chronological backjumping, VSIDS-like
+variable activity, phase saving and geometric restarts. It keeps every
+learnt clause, which is fine for puzzle-sized formulas.
+"""
+
+
+def _lit(x: int) -> int:
+  return 2 * (abs(x) - 1) + (x < 0)
+
+
+class Solver:
+  def __init__(self):
+    self.num_vars = 0
+    self.clauses = []
+    self.watches = []
+    # per variable: 1 true, 0 false, -1 unassigned
+    self.values = []
+    self.levels = []
+    self.reasons = []
+    self.activity = []
+    self.phase = []
+    self.trail = []
+    self.trail_lim = []
+    self.qhead = 0
+    self.var_inc = 1.0
+    self.ok = True
+    self.model = None
+    self.conflicts = 0
+    self.decisions = 0
+    self.propagations = 0
+
+  def new_var(self) -> int:
+    self.num_vars += 1
+    self.values.append(-1)
+    self.levels.append(0)
+    self.reasons.append(None)
+    self.activity.append(0.0)
+    self.phase.append(0)
+    self.watches.append([])
+    self.watches.append([])
+    return self.num_vars
+
+  def add_clause(self, lits: list) -> bool:
+    """Add clause of DIMACS literals, return False if formula became unsatisfiable"""
+    if not self.ok:
+      return False
+    self._cancel_until(0)
+    clause = []
+    for x in lits:
+      while abs(x) > self.num_vars:
+        self.new_var()
+      lit = _lit(x)
+      if lit ^ 1 in clause:
+        return True
+      if lit in clause:
+        continue
+      value = self._lit_value(lit)
+      if value == 1:
+        return True
+      if value == 0:
+        continue
+      clause.append(lit)
+    if not clause:
+      self.ok = False
+    elif len(clause) == 1:
+      self._enqueue(clause[0], None)
+      self.ok = self._propagate() is None
+    else:
+      self._attach(clause)
+    return self.ok
+
+  def solve(self, restart_first: int=100, restart_inc: float=1.5) -> bool:
+    self.model = None
+    if not self.ok:
+      return False
+    self._cancel_until(0)
+    if self._propagate() is not None:
+      self.ok = False
+      return False
+    restart_limit = restart_first
+    since_restart = 0
+    while True:
+      confl = self._propagate()
+      if confl is not None:
+        self.conflicts += 1
+        since_restart += 1
+        if not self.trail_lim:
+          self.ok = False
+          return False
+        learnt, backjump = self._analyze(confl)
+        self._cancel_until(backjump)
+        if len(learnt) == 1:
+          self._enqueue(learnt[0], None)
+        else:
+          self._enqueue(learnt[0], self._attach(learnt))
+        self.var_inc /= 0.95
+        continue
+      if since_restart >= restart_limit:
+        since_restart = 0
+        restart_limit *= restart_inc
+        self._cancel_until(0)
+        continue
+      var = self._pick_branch()
+      if var < 0:
+        self.model = [None] + [v == 1 for v in self.values]
+        self._cancel_until(0)
+        return True
+      self.decisions += 1
+      self.trail_lim.append(len(self.trail))
+      self._enqueue(2 * var + (1 - self.phase[var]), None)
+
+  def _lit_value(self, lit: int) -> int:
+    value = self.values[lit >> 1]
+    return value if value < 0 else value ^ (lit & 1)
+
+  def _attach(self, clause: list) -> int:
+    idx = len(self.clauses)
+    self.clauses.append(clause)
+    self.watches[clause[0]].append(idx)
+    self.watches[clause[1]].append(idx)
+    return idx
+
+  def _enqueue(self, lit: int, reason: int):
+    var = lit >> 1
+    self.values[var] = 1 - (lit & 1)
+    self.levels[var] = len(self.trail_lim)
+    self.reasons[var] = reason
+    self.trail.append(lit)
+
+  def _propagate(self) -> int:
+    """Return index of conflicting clause or None"""
+    values = self.values
+    clauses = self.clauses
+    watches = self.watches
+    while self.qhead < len(self.trail):
+      false_lit = self.trail[self.qhead] ^ 1
+      self.qhead += 1
+      self.propagations += 1
+      watching = watches[false_lit]
+      keep = []
+      for n, ci in enumerate(watching):
+        c = clauses[ci]
+        if c[0] == false_lit:
+          c[0], c[1] = c[1], false_lit
+        first = c[0]
+        fv = values[first >> 1]
+        if fv >= 0 and fv ^ (first & 1) == 1:
+          keep.append(ci)
+          continue
+        for k in range(2, len(c)):
+          lit = c[k]
+          v = values[lit >> 1]
+          if v < 0 or v ^ (lit & 1) == 1:
+            c[1], c[k] = lit, false_lit
+            watches[lit].append(ci)
+            break
+        else:
+          keep.append(ci)
+          if fv >= 0:
+            keep.extend(watching[n + 1:])
+            watches[false_lit] = keep
+            self.qhead = len(self.trail)
+            return ci
+          self._enqueue(first, ci)
+      watches[false_lit] = keep
+    return None
+
+  def _analyze(self, confl: int) -> tuple:
+    seen = set()
+    learnt = [None]
+    level = len(self.trail_lim)
+    counter = 0
+    lit = None
+    idx = len(self.trail) - 1
+    clause = self.clauses[confl]
+    while True:
+      for q in (clause if lit is None else clause[1:]):
+        var = q >> 1
+        if var in seen or self.levels[var] == 0:
+          continue
+        seen.add(var)
+        self._bump(var)
+        if self.levels[var] >= level:
+          counter += 1
+        else:
+          learnt.append(q)
+      while (self.trail[idx] >> 1) not in seen:
+        idx -= 1
+      lit = self.trail[idx]
+      idx -= 1
+      counter -= 1
+      if counter == 0:
+        break
+      clause = self.clauses[self.reasons[lit >> 1]]
+    learnt[0] = lit ^ 1
+    backjump = 0
+    if len(learnt) > 1:
+      best = max(range(1, len(learnt)), key=lambda k: self.levels[learnt[k] >> 1])
+      learnt[1], learnt[best] = learnt[best], learnt[1]
+      backjump = self.levels[learnt[1] >> 1]
+    return learnt, backjump
+
+  def _bump(self, var: int):
+    self.activity[var] += self.var_inc
+    if self.activity[var] > 1e100:
+      self.activity = [a * 1e-100 for a in self.activity]
+      self.var_inc *= 1e-100
+
+  def _cancel_until(self, level: int):
+    if len(self.trail_lim) <= level:
+      return
+    start = self.trail_lim[level]
+    for lit in self.trail[start:]:
+      var = lit >> 1
+      self.phase[var] = self.values[var]
+      self.values[var] = -1
+      self.reasons[var] = None
+    del self.trail[start:]
+    del self.trail_lim[level:]
+    self.qhead = len(self.trail)
+
+  def _pick_branch(self) -> int:
+    best = -1
+    best_activity = -1.0
+    for var, value in enumerate(self.values):
+      if value < 0 and self.activity[var] > best_activity:
+        best = var
+        best_activity = self.activity[var]
+    return best
+
+
+def write_dimacs(path: str, num_vars: int, clauses: list, comments: list=None):
+  with open(path, 'w') as f:
+    for comment in comments or []:
+      f.write(f'c {comment}\n')
+    f.write(f'p cnf {num_vars} {len(clauses)}\n')
+    for clause in clauses:
+      f.write(' '.join(map(str, clause)) + ' 0\n')
+
+
+def read_dimacs(path: str) -> tuple:
+  num_vars = 0
+  clauses = []
+  clause = []
+  for line in open(path):
+    line = line.strip()
+    if not line or line[0] in 'c%':
+      continue
+    if line.startswith('p'):
+      num_vars = int(line.split()[2])
+      continue
+    for x in map(int, line.split()):
+      if x == 0:
+        clauses.append(clause)
+        clause = []
+      else:
+        clause.append(x)
+  return num_vars, clauses
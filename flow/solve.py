@@ -1,9 +1,84 @@
+import argparse
+import os
 import sys
-from copy import deepcopy
+from itertools import combinations
+
+from sat import Solver, write_dimacs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import (Problem, Progress, add_arguments, no_solution_message, profile_from_args,
+                    progress_from_args, run_from_args)
+
+
+class Reachability:
+  """
+  Labels of the 4-connected regions of empty cells. Filling cells only
+  relabels the regions those cells were in, every other region keeps
+  its label, so a child state does not flood the whole grid again.
+  """
+  FILLED = -1
+
+  def __init__(self, cells: list, labels: list=None, next_label: int=0):
+    self._h = len(cells)
+    self._w = len(cells[0])
+    if labels is None:
+      self.labels = [Reachability.FILLED] * (self._h * self._w)
+      self.next_label = 0
+      self._relabel([i * self._w + j for i in range(self._h)
+                     for j in range(self._w) if cells[i][j] == '_'])
+    else:
+      self.labels = labels
+      self.next_label = next_label
+
+  def connected(self, a: tuple, b: tuple) -> bool:
+    """Whether a path can join cells a and b through empty cells"""
+    ra = self._regions_around(a)
+    return bool(ra) and not ra.isdisjoint(self._regions_around(b))
+
+  def fill(self, cells: list, positions: list) -> 'Reachability':
+    labels = list(self.labels)
+    affected = set()
+    for i, j in positions:
+      affected.add(labels[i * self._w + j])
+      labels[i * self._w + j] = Reachability.FILLED
+    affected.discard(Reachability.FILLED)
+    res = Reachability(cells, labels, self.next_label)
+    res._relabel([idx for idx, label in enumerate(labels) if label in affected])
+    return res
+
+  def _regions_around(self, pos: tuple) -> set:
+    i, j = pos
+    res = set()
+    for di, dj in [(0, -1), (-1, 0), (0, 1), (1, 0)]:
+      ni, nj = i + di, j + dj
+      if 0 <= ni < self._h and 0 <= nj < self._w:
+        label = self.labels[ni * self._w + nj]
+        if label != Reachability.FILLED:
+          res.add(label)
+    return res
+
+  def _relabel(self, indices: list):
+    pending = set(indices)
+    w = self._w
+    while pending:
+      start = pending.pop()
+      label = self.next_label
+      self.next_label += 1
+      self.labels[start] = label
+      stack = [start]
+      while stack:
+        cur = stack.pop()
+        i, j = divmod(cur, w)
+        for n in (cur - w if i > 0 else -1, cur + w if i < self._h - 1 else -1,
+                  cur - 1 if j > 0 else -1, cur + 1 if j < w - 1 else -1):
+          if n in pending:
+            pending.discard(n)
+            self.labels[n] = label
+            stack.append(n)
 
 
 class State:
-  def __init__(self, cells: list, finished_colors: list=None):
+  def __init__(self, cells: list, finished_colors: list=None, reach: Reachability=None):
     self.cells = cells
     self._h = len(cells)
     self._w = len(cells[0])
@@ -13,6 +88,10 @@ class State:
       self.finished_colors = []
     else:
       self.finished_colors = finished_colors
+    if reach is None:
+      self.reach = Reachability(cells)
+    else:
+      self.reach = reach
 
   @property
   def available_colors(self) -> list:
@@ -32,7 +111,11 @@ class State:
   @property
   def is_dead(self) -> bool:
     for color in self.available_colors:
-      if len(self.possible_paths(color)) == 0:
+      start = self.colors_start_pos[color]
+      end = self.colors_end_pos[color]
+      if end in self._neighbors(start):
+        continue
+      if not self.reach.connected(start, end):
         return True
     return False
   
@@ -73,13 +156,14 @@ class State:
     print('\n'.join(ctn))
   
   def step(self, path: list) -> 'State':
-    ncells = deepcopy(self.cells)
+    ncells = [list(row) for row in self.cells]
     # assume first and last path are the color
     i, j = path[0]
     color = ncells[i][j]
     for i, j in path[1:-1]:
       ncells[i][j] = color.lower()
-    return State(ncells, self.finished_colors + [color])
+    nreach = self.reach.fill(ncells, path[1:-1])
+    return State(ncells, self.finished_colors + [color], nreach)
 
   def step_all(self) -> list:
     res = []
@@ -90,11 +174,17 @@ class State:
   
   def _init_colors_start_pos(self):
     self.colors_start_pos = {}
+    self.colors_end_pos = {}
     for i in range(self._h):
       for j in range(self._w):
         cur = self.cells[i][j]
-        if cur != '_' and cur not in self.colors_start_pos:
+        # lowercase cells are paths of finished colors
+        if not cur.isupper():
+          continue
+        if cur not in self.colors_start_pos:
           self.colors_start_pos[cur] = (i, j)
+        else:
+          self.colors_end_pos[cur] = (i, j)
 
   def _init_flags(self):
     self.flags = []
@@ -123,12 +213,65 @@ class State:
     return True
 
 
+class PathsProblem(Problem):
+  """State on the shared search engine, a move puts one whole path of a color"""
+  def __init__(self, state: State):
+    self.state = state
+
+  def initial(self) -> State:
+    return self.state
+
+  def successors(self, state: State) -> list:
+    if state.is_dead:
+      return []
+    res = []
+    for color in state.available_colors:
+      for path in state.possible_paths(color):
+        res.append((path, state.step(path)))
+    return res
+
+  def is_goal(self, state: State) -> bool:
+    return state.is_finish
+
+  def key(self, state: State) -> tuple:
+    return tuple(''.join(row) for row in state.cells)
+
+  def heuristic(self, state: State) -> int:
+    return len(state.available_colors)
+
+
 def main():
-  if len(sys.argv) != 2:
-    print(f'Usage: python {sys.argv[0]} <input_file_path')
-    quit()
-  start_state = read_from_file(sys.argv[1])
-  sol = solve_bt(start_state)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('input_file_path')
+  parser.add_argument('--solver', choices=['cp', 'sat', 'paths', 'inplace'], default='cp',
+                      help='cp propagates forced moves cell by cell, sat encodes '
+                           'the grid as CNF, paths enumerates whole paths per color, '
+                           'inplace draws whole paths on one grid and erases them')
+  parser.add_argument('--dimacs', metavar='PATH', help='also write the CNF in DIMACS format')
+  add_arguments(parser, default='dfs')
+  args = parser.parse_args()
+  if args.dimacs and args.solver in ('paths', 'inplace'):
+    parser.error(f'--dimacs writes the CNF of the sat solver, not --solver {args.solver}')
+  start_state = read_from_file(args.input_file_path)
+  progress = progress_from_args(args)
+  profile_from_args(args, [
+    (State, ('possible_paths', 'step', 'is_dead', 'is_finish')),
+    (Reachability, ('fill', 'connected')),
+    (Grid, ('moves', 'propagate', '_alive')),
+    (FlowCNF, ('cycles',)),
+    (Solver, ('solve', '_propagate', '_analyze')),
+  ])
+  if args.solver == 'paths':
+    sol = solve(start_state, args)
+  elif args.solver == 'inplace':
+    sol = solve_inplace(start_state, progress)
+  elif args.solver == 'sat' or args.dimacs:
+    sol = solve_sat(start_state, args.dimacs, progress)
+  else:
+    sol = solve_cp(start_state, progress)
+  if sol is None:
+    print(no_solution_message(args))
+    return
   print('Solution:')
   sol.print()
 
@@ -145,54 +288,403 @@ def read_from_file(path: str) -> State:
   return State(cells)
 
 
-def solve(start_state: State) -> State:
-  stack = [start_state]
-  nod = 0
-  nos = 0
-  while stack:
-    print('nod:', nod, 'nos:', nos)
-    cur = stack.pop()
-    if cur.is_finish:
-      return cur
-    elif cur.is_dead:
-      nod += 1
-      continue
-    else:
-      ns = cur.step_all()
-      nos += len(ns)
-      stack.extend(ns)
+def solve(start_state: State, args) -> State:
+  """Search whole paths with the strategy and engine options in args"""
+  node = run_from_args(PathsProblem(start_state), args)
+  return None if node is None else node.state
 
 
-def solve_bt(start_state: State) -> State:
-  cells = deepcopy(start_state.cells)
-  av_colors = list(map(str.lower, start_state.colors_start_pos.keys()))
+def solve_inplace(start_state: State, progress: Progress=None) -> State:
+  """
+  Whole paths like the paths solver, but drawn on one cells grid. The
+  paths of a color are walked depth first, marking cells on the way in
+  and clearing them on the way back, and a finished path stays on the
+  grid while the next color is searched. Colors go in order (each one
+  needs a path anyway). Like the cp and sat solvers a solution fills
+  every cell, so after every step the empty cells are split into
+  regions: a color still to draw must have both ends on one region (or
+  next to each other) and every region must have both ends of such a
+  color on its border, else the branch ends. Nothing is copied and
+  memory is O(cells).
+  """
+  if progress is None:
+    progress = Progress()
+  state = start_state
+  cells = [list(row) for row in state.cells]
+  colors = state.available_colors
+  neighbors = {(i, j): state._neighbors((i, j)) for i in range(state._h) for j in range(state._w)}
+  nodes = 0
+
+  def feasible(k: int, head: tuple=None) -> bool:
+    """Whether colors[k:] (colors[k] drawn up to head) can still fill the grid"""
+    ends = [(state.colors_start_pos[color], state.colors_end_pos[color]) for color in colors[k:]]
+    if head is not None:
+      ends[0] = (head, ends[0][1])
+    # cell -> region number of the empty cells, borders[region] the cells around it
+    region = {}
+    borders = []
+    for i in range(state._h):
+      for j in range(state._w):
+        if cells[i][j] != '_' or (i, j) in region:
+          continue
+        region[(i, j)] = len(borders)
+        stack = [(i, j)]
+        border = set()
+        while stack:
+          for n in neighbors[stack.pop()]:
+            if cells[n[0]][n[1]] != '_':
+              border.add(n)
+            elif n not in region:
+              region[n] = len(borders)
+              stack.append(n)
+        borders.append(border)
+    filled = [False] * len(borders)
+    for start, end in ends:
+      joined = end in neighbors[start]
+      for r, border in enumerate(borders):
+        # a path through a region lies in it between its two ends
+        if start in border and end in border:
+          joined = filled[r] = True
+      if not joined:
+        return False
+    return all(filled)
+
+  def search(k: int) -> bool:
+    nonlocal nodes
+    nodes += 1
+    progress.update(nodes, None, k)
+    if k == len(colors):
+      return True
+    color = colors[k]
+    end = state.colors_end_pos[color]
+    mark = color.lower()
+
+    def extend(pos: tuple) -> bool:
+      for n in neighbors[pos]:
+        if n == end:
+          if feasible(k + 1) and search(k + 1):
+            return True
+        elif cells[n[0]][n[1]] == '_':
+          cells[n[0]][n[1]] = mark
+          if feasible(k, n) and extend(n):
+            return True
+          cells[n[0]][n[1]] = '_'
+      return False
+
+    return extend(state.colors_start_pos[color])
+
+  found = feasible(0) and search(0)
+  progress.log('Nodes:', nodes)
+  return State(cells) if found else None
 
-  def incr(pos: tuple) -> tuple:
-    i, j = pos
-    j += 1
-    if j >= len(cells[0]):
-      i += 1
-      j = 0
-    return (i, j)
 
-  def is_safe_up_to(pos: tuple):
+class Grid:
+  """
+  Cell assignment view of a State for solve_cp. Cells are flat
+  (index i * w + j) and hold a color number or EMPTY. Every color is
+  grown from its first endpoint (head) toward its second one (goal).
+  """
+  EMPTY = -1
+
+  def __init__(self, state: State):
+    self.h = state._h
+    self.w = state._w
+    self.colors = []
+    self.ends = []
+    self.cells = [Grid.EMPTY] * (self.h * self.w)
+    for i in range(self.h):
+      for j in range(self.w):
+        cur = state.cells[i][j]
+        if cur == '_':
+          continue
+        if cur not in self.colors:
+          self.colors.append(cur)
+          self.ends.append([])
+        color = self.colors.index(cur)
+        self.ends[color].append(i * self.w + j)
+        self.cells[i * self.w + j] = color
+    for color, ends in enumerate(self.ends):
+      if len(ends) != 2:
+        raise ValueError(f'color {self.colors[color]} must have exactly 2 endpoints')
+    self.goals = [ends[1] for ends in self.ends]
+    self.neighbors = []
+    for idx in range(self.h * self.w):
+      pos = divmod(idx, self.w)
+      self.neighbors.append([i * self.w + j for i, j in state._neighbors(pos)])
+    self.nodes = 0
+    self.progress = None
+
+  def to_state(self, cells: list) -> State:
+    res = []
+    for i in range(self.h):
+      row = []
+      for j in range(self.w):
+        idx = i * self.w + j
+        color = self.colors[cells[idx]]
+        row.append(color if idx in self.ends[cells[idx]] else color.lower())
+      res.append(row)
+    return State(res, finished_colors=list(self.colors))
+
+  def moves(self, cells: list, head: int, color: int) -> list:
+    """Cells head can go next, its goal (finishing the color) comes first"""
+    goal = self.goals[color]
+    res = [goal] if goal in self.neighbors[head] else []
+    for n in self.neighbors[head]:
+      if cells[n] == Grid.EMPTY:
+        res.append(n)
+    return res
+
+  def propagate(self, cells: list, heads: list, done: list) -> bool:
+    """Apply forced moves in place, return False on contradiction"""
+    changed = True
+    while changed:
+      changed = False
+      for color, head in enumerate(heads):
+        if done[color]:
+          continue
+        moves = self.moves(cells, head, color)
+        if not moves:
+          return False
+        if len(moves) == 1:
+          self._advance(cells, heads, done, color, moves[0])
+          changed = True
+    return self._alive(cells, heads, done)
+
+  def _advance(self, cells: list, heads: list, done: list, color: int, move: int):
+    if move == self.goals[color]:
+      done[color] = True
+    else:
+      cells[move] = color
+      heads[color] = move
+
+  def solve(self) -> list:
+    heads = [ends[0] for ends in self.ends]
+    return self._search(list(self.cells), heads, [False] * len(self.colors))
+
+  def _alive(self, cells: list, heads: list, done: list) -> bool:
+    # cells an unfinished path may still enter or leave through
+    open_ends = {}
+    for color, head in enumerate(heads):
+      if not done[color]:
+        open_ends[head] = color
+        open_ends[self.goals[color]] = color
+    # dead cell: an empty cell needs two neighbors to pass a path through
+    for idx, cell in enumerate(cells):
+      if cell != Grid.EMPTY:
+        continue
+      free = 0
+      for n in self.neighbors[idx]:
+        if cells[n] == Grid.EMPTY or n in open_ends:
+          free += 1
+      if free < 2:
+        return False
+    # stranded region: every empty region must be reachable by a color
+    # touching it with both ends, and every color needs such a region
+    region_of = {}
+    usable = set()
+    for idx, cell in enumerate(cells):
+      if cell != Grid.EMPTY or idx in region_of:
+        continue
+      region = len(usable) + len(region_of)
+      stack = [idx]
+      region_of[idx] = region
+      touch = {}
+      while stack:
+        cur = stack.pop()
+        for n in self.neighbors[cur]:
+          if cells[n] == Grid.EMPTY:
+            if n not in region_of:
+              region_of[n] = region
+              stack.append(n)
+          elif n in open_ends:
+            touch.setdefault(open_ends[n], set()).add(n)
+      ok = False
+      for color, ends in touch.items():
+        if heads[color] in ends and self.goals[color] in ends:
+          usable.add((color, region))
+          ok = True
+      if not ok:
+        return False
+    connected = {color for color, _ in usable}
+    for color, head in enumerate(heads):
+      if done[color] or color in connected:
+        continue
+      if self.goals[color] not in self.neighbors[head]:
+        return False
     return True
 
-  def util(pos: tuple):
-    i, j = pos
-    if i >= len(cells):
-      return
-    while cells[i][j].isupper():
-      i, j = incr((i, j))
-
-    for color in av_colors:
-      cells[i][j] = color
-      if is_safe_up_to(pos):
-        if (i >= len(cells) - 1 and j >= len(cells[0]) - 1) or util(incr(pos)):
-            return State(cells)
-  
-  return util((0,0))
-  
+  def _search(self, cells: list, heads: list, done: list) -> list:
+    self.nodes += 1
+    if self.progress is not None:
+      self.progress.update(self.nodes, None, sum(done))
+    if not self.propagate(cells, heads, done):
+      return None
+    if all(done):
+      return cells if Grid.EMPTY not in cells else None
+    # branch on the most constrained head
+    best = None
+    for color, head in enumerate(heads):
+      if done[color]:
+        continue
+      moves = self.moves(cells, head, color)
+      if best is None or len(moves) < len(best[1]):
+        best = (color, moves)
+    color, moves = best
+    for move in moves:
+      ncells = list(cells)
+      nheads = list(heads)
+      ndone = list(done)
+      self._advance(ncells, nheads, ndone, color, move)
+      res = self._search(ncells, nheads, ndone)
+      if res is not None:
+        return res
+    return None
+
+
+def solve_cp(start_state: State, progress: Progress=None) -> State:
+  grid = Grid(start_state)
+  grid.progress = Progress() if progress is None else progress
+  cells = grid.solve()
+  grid.progress.log('Nodes:', grid.nodes)
+  if cells is None:
+    return None
+  return grid.to_state(cells)
+
+
+class FlowCNF:
+  """
+  CNF encoding of a Grid for SAT solvers.
+  - cell i has exactly one color: variable i * K + k + 1 for color k
+  - every pair of adjacent cells has an edge variable (after colors)
+  - endpoint cells have their color and exactly 1 active edge,
+    other cells exactly 2 active edges
+  - an active edge joins cells of the same color
+  Components of active edges are then paths between the two endpoints
+  of a color, or cycles away from endpoints. Cycles are removed lazily
+  by forbidding them and solving again (see solve_sat).
+  """
+  def __init__(self, grid: Grid):
+    self.grid = grid
+    ncolors = len(grid.colors)
+    ncells = grid.h * grid.w
+    self.edges = []
+    for a in range(ncells):
+      for b in grid.neighbors[a]:
+        if a < b:
+          self.edges.append((a, b))
+    self.incident = [[] for _ in range(ncells)]
+    for e, (a, b) in enumerate(self.edges):
+      self.incident[a].append(self.edge_var(e))
+      self.incident[b].append(self.edge_var(e))
+    self.num_vars = ncells * ncolors + len(self.edges)
+    self.clauses = []
+    endpoints = {}
+    for color, ends in enumerate(grid.ends):
+      for idx in ends:
+        endpoints[idx] = color
+    for idx in range(ncells):
+      lits = [self.color_var(idx, k) for k in range(ncolors)]
+      self.clauses.append(lits)
+      for x, y in combinations(lits, 2):
+        self.clauses.append([-x, -y])
+      edges = self.incident[idx]
+      if idx in endpoints:
+        self.clauses.append([self.color_var(idx, endpoints[idx])])
+        self._exactly(edges, 1)
+      else:
+        self._exactly(edges, 2)
+    for e, (a, b) in enumerate(self.edges):
+      ev = self.edge_var(e)
+      for k in range(ncolors):
+        self.clauses.append([-ev, -self.color_var(a, k), self.color_var(b, k)])
+        self.clauses.append([-ev, -self.color_var(b, k), self.color_var(a, k)])
+
+  def color_var(self, idx: int, color: int) -> int:
+    return idx * len(self.grid.colors) + color + 1
+
+  def edge_var(self, e: int) -> int:
+    return self.grid.h * self.grid.w * len(self.grid.colors) + e + 1
+
+  def decode(self, model: list) -> list:
+    cells = []
+    for idx in range(self.grid.h * self.grid.w):
+      for k in range(len(self.grid.colors)):
+        if model[self.color_var(idx, k)]:
+          cells.append(k)
+          break
+    return cells
+
+  def cycles(self, model: list) -> list:
+    """Edge variables of every active component with no endpoint"""
+    adjacent = [[] for _ in range(self.grid.h * self.grid.w)]
+    for e, (a, b) in enumerate(self.edges):
+      if model[self.edge_var(e)]:
+        adjacent[a].append((b, e))
+        adjacent[b].append((a, e))
+    endpoints = {idx for ends in self.grid.ends for idx in ends}
+    seen = set()
+    res = []
+    for start in range(len(adjacent)):
+      if start in seen or not adjacent[start]:
+        continue
+      seen.add(start)
+      stack = [start]
+      cells = [start]
+      edges = set()
+      while stack:
+        cur = stack.pop()
+        for n, e in adjacent[cur]:
+          edges.add(e)
+          if n not in seen:
+            seen.add(n)
+            stack.append(n)
+            cells.append(n)
+      if not endpoints.intersection(cells):
+        res.append([self.edge_var(e) for e in sorted(edges)])
+    return res
+
+  def write_dimacs(self, path: str):
+    g = self.grid
+    write_dimacs(path, self.num_vars, self.clauses, [
+      f'flow {g.h}x{g.w} colors {"".join(g.colors)}',
+      f'var cell * {len(g.colors)} + color + 1 is cell color, '
+      f'edges start after {g.h * g.w * len(g.colors)}',
+      'cycles are not excluded, drop models with a cycle away from endpoints',
+    ])
+
+  def _exactly(self, lits: list, n: int):
+    # at least n: every len(lits) - n + 1 of them has a true one
+    for group in combinations(lits, len(lits) - n + 1):
+      self.clauses.append(list(group))
+    for group in combinations(lits, n + 1):
+      self.clauses.append([-x for x in group])
+
+
+def solve_sat(start_state: State, dimacs_path: str=None, progress: Progress=None) -> State:
+  if progress is None:
+    progress = Progress()
+  grid = Grid(start_state)
+  cnf = FlowCNF(grid)
+  if dimacs_path:
+    cnf.write_dimacs(dimacs_path)
+  solver = Solver()
+  for clause in cnf.clauses:
+    solver.add_clause(clause)
+  rounds = 0
+  while True:
+    rounds += 1
+    if not solver.solve():
+      progress.log('Rounds:', rounds, 'conflicts:', solver.conflicts)
+      return None
+    cycles = cnf.cycles(solver.model)
+    if not cycles:
+      break
+    for cycle in cycles:
+      solver.add_clause([-ev for ev in cycle])
+  progress.log('Variables:', cnf.num_vars, 'clauses:', len(cnf.clauses), 'rounds:', rounds,
+               'conflicts:', solver.conflicts, 'decisions:', solver.decisions)
+  return grid.to_state(cnf.decode(solver.model))
+
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,772 @@
+"""
+Search engine shared by the solvers
+
+A puzzle describes itself as a Problem: the initial state, the moves
+from a state as (move, next state) pairs, the goal test, a hashable key
+used to detect repeated states and an optional heuristic. The heuristic
+is an estimate of what is left (lower is more promising); A* and IDA*
+return shortest paths only if it never overestimates the moves left.
+
+Search runs one of the strategies over a problem:
+- bfs: breadth first, shortest path in moves
+- dfs: depth first, children are tried in the order successors yields them
+- iddfs: depth first with growing depth limit, keeps only the current path
+- idastar: iddfs with a limit on depth + heuristic, shortest path in moves
+  with an admissible heuristic and memory only for the current path
+- astar: best first on depth + weight * heuristic
+- greedy: best first on heuristic alone
+- beam: breadth first keeping only the best beam_width states per depth
+
+Repeated states are skipped through a visited store: 'set' remembers
+every key, 'lru' forgets the least recently seen keys past its size,
+'bloom' is a bloom filter which needs a few bits per key but may skip a
+state it has never seen (so the search may miss a solution) and 'none'
+remembers nothing. With 'lru' or 'none' dfs can walk in circles, give
+it max_depth or a limit. Search stops early at max_nodes expansions or after
+time_limit seconds. stats.stopped tells why a search that found nothing
+is not a proof: one of those limits, states at max_depth left unexpanded,
+beam dropping states or a bloom store which skipped states it called
+seen. no_solution_message tells the user, so an incomplete search is not
+mistaken for an unsolvable puzzle.
+
+Solutions are returned as Node, node.path() lists the moves from the
+initial state and node.state is the goal state.
+
+Progress is the rate limited reporter used by the engine and by the
+hand written search loops of the solvers. update() is meant to be
+called on every node and prints (to stderr) at most every interval_ms
+milliseconds: nodes, nodes per second, frontier size, depth and peak
+memory. Verbosity 0 (--quiet) prints nothing at all, 1 prints those
+lines and summaries, 2 (--verbose) also prints whenever depth grows.
+Nodes, peak frontier and depth are kept even when quiet and written as
+JSON at exit with --stats-json (bench.py reads them).
+
+Profiler times named phases of a solver (State.step, Board.place, ...)
+with perf_counter_ns. The solvers list their phases and wrap them only
+with --profile, so a normal run executes the unwrapped code.
+--cprofile and --tracemalloc dump the whole run for a closer look.
+"""
+
+import atexit
+import functools
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+from heapq import heappop, heappush, nsmallest
+from math import ceil, log
+from operator import itemgetter
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+STRATEGIES = ('bfs', 'dfs', 'iddfs', 'idastar', 'astar', 'greedy', 'beam')
+# strategies which call Problem.heuristic
+INFORMED = ('idastar', 'astar', 'greedy', 'beam')
+STORES = ('set', 'lru', 'bloom', 'none')
+# time limit is checked every CLOCK_INTERVAL expansions
+CLOCK_INTERVAL = 1024
+# Stats.stopped -> why the search may have missed a solution
+INCOMPLETE = {
+  'max nodes': 'stopped by max nodes',
+  'time limit': 'stopped by time limit',
+  'max depth': 'states at max depth were not expanded',
+  'beam width': 'beam dropped states',
+  'bloom filter': 'the bloom store may have skipped unseen states',
+}
+
+
+class Progress:
+  def __init__(self, interval_ms: int=1000, verbosity: int=1):
+    self.interval = interval_ms / 1000
+    self.verbosity = verbosity
+    self.reset()
+
+  def reset(self):
+    self.start_time = time.time()
+    self.next_time = self.start_time + self.interval
+    self.nodes = 0
+    self.max_frontier = 0
+    self.depth = 0
+
+  def update(self, nodes: int, frontier: int=None, depth: int=None):
+    self.nodes = nodes
+    if frontier is not None and frontier > self.max_frontier:
+      self.max_frontier = frontier
+    deeper = depth is not None and depth > self.depth
+    if deeper:
+      self.depth = depth
+    if not self.verbosity:
+      return
+    if deeper and self.verbosity > 1:
+      self.report(nodes, frontier, depth)
+      return
+    now = time.time()
+    if now >= self.next_time:
+      self.next_time = now + self.interval
+      self.report(nodes, frontier, depth)
+
+  def report(self, nodes: int, frontier: int=None, depth: int=None):
+    elapsed = time.time() - self.start_time
+    rate = nodes / elapsed if elapsed > 0 else 0
+    parts = [f'[{elapsed:.1f}s] nodes: {nodes} ({rate:.0f}/s)']
+    if frontier is not None:
+      parts.append(f'frontier: {frontier}')
+    if depth is not None:
+      parts.append(f'depth: {depth}')
+    rss = peak_rss()
+    if rss is not None:
+      parts.append(f'peak rss: {rss / 2 ** 20:.1f} MB')
+    print(' '.join(parts), file=sys.stderr, flush=True)
+
+  def log(self, *args):
+    """print unless quiet"""
+    if self.verbosity:
+      print(*args)
+
+  def dump(self, path: str):
+    stats = {
+      'nodes': self.nodes,
+      'max_frontier': self.max_frontier,
+      'max_depth': self.depth,
+      'elapsed': time.time() - self.start_time,
+      'peak_rss': peak_rss(),
+    }
+    with open(path, 'w') as f:
+      json.dump(stats, f)
+
+
+def peak_rss() -> int:
+  """Peak resident memory of this process in bytes, None where it is not known"""
+  if resource is None:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # bytes on macOS, kilobytes elsewhere
+  return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Profiler:
+  """
+  Call counts and time of named phases (functions and methods) of a
+  solver. instrument() swaps the phases for timed wrappers, so nothing
+  is paid until it is called. Phases are split by the phase they were
+  called from: Board.place called from State.step is reported under it.
+  A phase calling itself is counted and timed once, in the outermost
+  call. Every timed call costs a few hundred nanoseconds of wrapper,
+  which the times include.
+  """
+  def __init__(self):
+    self.calls = {}
+    self.times = {}
+    self.stack = [()]
+    self.start_time = time.perf_counter_ns()
+
+  def instrument(self, target, *names):
+    """Time names of target, a class or a module (for its functions)"""
+    prefix = target.__name__ + '.' if isinstance(target, type) else ''
+    for name in names:
+      attr = vars(target).get(name, getattr(target, name))
+      if isinstance(attr, property):
+        attr = property(self.wrap(prefix + name, attr.fget), attr.fset, attr.fdel)
+      elif isinstance(attr, staticmethod):
+        attr = staticmethod(self.wrap(prefix + name, attr.__func__))
+      else:
+        attr = self.wrap(prefix + name, attr)
+      setattr(target, name, attr)
+
+  def wrap(self, name: str, func):
+    calls = self.calls
+    times = self.times
+    stack = self.stack
+    clock = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+      parent = stack[-1]
+      if name in parent:
+        return func(*args, **kwargs)
+      path = parent + (name,)
+      stack.append(path)
+      start = clock()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        times[path] = times.get(path, 0) + clock() - start
+        calls[path] = calls.get(path, 0) + 1
+        stack.pop()
+    return timed
+
+  def report(self, file=sys.stderr):
+    """Phases as a tree: calls, total and self time, share of the wall time"""
+    wall = max(time.perf_counter_ns() - self.start_time, 1)
+    print(f'{"phase":<40} {"calls":>10} {"total ms":>10} {"self ms":>10} '
+          f'{"wall %":>7} {"ns/call":>9}', file=file)
+    for path in sorted(self.times):
+      total = self.times[path]
+      children = sum(t for p, t in self.times.items() if len(p) == len(path) + 1 and p[:-1] == path)
+      calls = self.calls[path]
+      name = '  ' * (len(path) - 1) + path[-1]
+      print(f'{name:<40} {calls:>10} {total / 1e6:>10.1f} {(total - children) / 1e6:>10.1f} '
+            f'{100 * total / wall:>6.1f}% {total // calls:>9}', file=file)
+    print(f'wall {wall / 1e6:.1f} ms', file=file)
+
+
+class Problem:
+  def initial(self):
+    raise NotImplementedError
+
+  def successors(self, state):
+    """Iterable of (move, next state)"""
+    raise NotImplementedError
+
+  def is_goal(self, state) -> bool:
+    raise NotImplementedError
+
+  def key(self, state):
+    return state
+
+  def heuristic(self, state) -> float:
+    return 0
+
+
+class Node:
+  __slots__ = ('state', 'parent', 'move', 'depth')
+
+  def __init__(self, state, parent: 'Node'=None, move=None, depth: int=0):
+    self.state = state
+    self.parent = parent
+    self.move = move
+    self.depth = depth
+
+  def path(self) -> list:
+    res = []
+    node = self
+    while node.parent is not None:
+      res.append(node.move)
+      node = node.parent
+    res.reverse()
+    return res
+
+
+class SetStore:
+  def __init__(self):
+    self.keys = set()
+
+  def add(self, key) -> bool:
+    """Remember key, return False if it was seen before"""
+    if key in self.keys:
+      return False
+    self.keys.add(key)
+    return True
+
+  def __contains__(self, key) -> bool:
+    return key in self.keys
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  def clear(self):
+    self.keys.clear()
+
+
+class LRUStore:
+  def __init__(self, max_entries: int):
+    self.max_entries = max_entries
+    self.keys = OrderedDict()
+    self.evictions = 0
+
+  def add(self, key) -> bool:
+    if key in self.keys:
+      self.keys.move_to_end(key)
+      return False
+    self.keys[key] = None
+    if len(self.keys) > self.max_entries:
+      self.keys.popitem(last=False)
+      self.evictions += 1
+    return True
+
+  def __contains__(self, key) -> bool:
+    return key in self.keys
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  def clear(self):
+    self.keys.clear()
+
+
+class BloomStore:
+  """
+  Sized for capacity keys at error_rate false positives. Positions are
+  derived from one hash of the key by double hashing.
+  """
+  # a false positive skips a state that was never seen
+  may_skip = True
+
+  def __init__(self, capacity: int, error_rate: float=0.01):
+    self.num_bits = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+    self.num_hashes = max(1, round(self.num_bits / capacity * log(2)))
+    self.bits = bytearray((self.num_bits + 7) // 8)
+    self.count = 0
+
+  def _positions(self, key) -> list:
+    h = (hash(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    h1 = h & 0xFFFFFFFF
+    h2 = (h >> 32) | 1
+    return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+  def add(self, key) -> bool:
+    bits = self.bits
+    new = False
+    for pos in self._positions(key):
+      byte, bit = pos >> 3, 1 << (pos & 7)
+      if not bits[byte] & bit:
+        bits[byte] |= bit
+        new = True
+    if new:
+      self.count += 1
+    return new
+
+  def __contains__(self, key) -> bool:
+    bits = self.bits
+    return all(bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(key))
+
+  def __len__(self) -> int:
+    return self.count
+
+  def clear(self):
+    self.bits = bytearray(len(self.bits))
+    self.count = 0
+
+
+class NullStore:
+  def add(self, key) -> bool:
+    return True
+
+  def __contains__(self, key) -> bool:
+    return False
+
+  def __len__(self) -> int:
+    return 0
+
+  def clear(self):
+    pass
+
+
+def make_store(kind: str='set', size: int=1_000_000):
+  if kind == 'set':
+    return SetStore()
+  if kind == 'lru':
+    return LRUStore(size)
+  if kind == 'bloom':
+    return BloomStore(size)
+  if kind == 'none':
+    return NullStore()
+  raise ValueError(f'unknown visited store {kind}')
+
+
+class Stats:
+  def __init__(self, strategy: str=None):
+    self.strategy = strategy
+    self.expanded = 0
+    self.generated = 0
+    self.duplicates = 0
+    self.max_frontier = 0
+    self.max_depth = 0
+    # depth limits tried by iddfs/idastar
+    self.iterations = 0
+    # key of INCOMPLETE when the search gave up or may have missed states
+    self.stopped = None
+    self.start_time = time.time()
+    self.elapsed = 0.0
+
+  def report(self):
+    print(f'Search: {self.strategy} expanded: {self.expanded} generated: {self.generated}',
+          f'duplicates: {self.duplicates} max frontier: {self.max_frontier}',
+          f'max depth: {self.max_depth} ({self.elapsed} seconds)')
+    if self.iterations:
+      print('Iterations:', self.iterations)
+    if self.stopped is not None:
+      print('Search incomplete:', INCOMPLETE[self.stopped])
+
+
+class Search:
+  def __init__(self, problem: Problem, visited=None, max_nodes: int=None,
+               time_limit: float=None, max_depth: int=None, progress: Progress=None):
+    self.problem = problem
+    self.progress = Progress() if progress is None else progress
+    self.visited = SetStore() if visited is None else visited
+    self.max_nodes = max_nodes
+    self.time_limit = time_limit
+    self.max_depth = max_depth
+    self.stats = Stats()
+    self.deadline = None
+
+  def run(self, strategy: str='bfs', **options) -> Node:
+    if strategy not in STRATEGIES:
+      raise ValueError(f'unknown strategy {strategy}')
+    return getattr(self, strategy)(**options)
+
+  def bfs(self) -> Node:
+    problem = self.problem
+    stats = self._begin('bfs')
+    root = Node(problem.initial())
+    self.visited.add(problem.key(root.state))
+    if problem.is_goal(root.state):
+      return self._end(root)
+    q = deque([root])
+    while q:
+      node = q.popleft()
+      if self.max_depth is not None and node.depth >= self.max_depth:
+        self._incomplete('max depth')
+        continue
+      if self._tick(len(q), node.depth):
+        break
+      depth = node.depth + 1
+      for move, state in problem.successors(node.state):
+        stats.generated += 1
+        if not self.visited.add(problem.key(state)):
+          stats.duplicates += 1
+          continue
+        child = Node(state, node, move, depth)
+        if problem.is_goal(state):
+          stats.max_depth = max(stats.max_depth, depth)
+          return self._end(child)
+        q.append(child)
+      if len(q) > stats.max_frontier:
+        stats.max_frontier = len(q)
+      if q and q[-1].depth > stats.max_depth:
+        stats.max_depth = q[-1].depth
+    return self._end(None)
+
+  def dfs(self) -> Node:
+    problem = self.problem
+    stats = self._begin('dfs')
+    root = Node(problem.initial())
+    self.visited.add(problem.key(root.state))
+    stack = [root]
+    while stack:
+      node = stack.pop()
+      if node.depth > stats.max_depth:
+        stats.max_depth = node.depth
+      if problem.is_goal(node.state):
+        return self._end(node)
+      if self.max_depth is not None and node.depth >= self.max_depth:
+        self._incomplete('max depth')
+        continue
+      if self._tick(len(stack), node.depth):
+        break
+      depth = node.depth + 1
+      children = []
+      for move, state in problem.successors(node.state):
+        stats.generated += 1
+        if not self.visited.add(problem.key(state)):
+          stats.duplicates += 1
+          continue
+        children.append(Node(state, node, move, depth))
+      # first successor ends up on top of the stack
+      children.reverse()
+      stack.extend(children)
+      if len(stack) > stats.max_frontier:
+        stats.max_frontier = len(stack)
+    return self._end(None)
+
+  def iddfs(self) -> Node:
+    """The visited store is not used, only states on the current path are skipped"""
+    self._begin('iddfs')
+    return self._end(self._iterative(lambda state: 0), visited=False)
+
+  def idastar(self) -> Node:
+    """iddfs on depth + heuristic, the limit grows to the smallest value above it"""
+    self._begin('idastar')
+    return self._end(self._iterative(self.problem.heuristic), visited=False)
+
+  def _iterative(self, heuristic) -> Node:
+    stats = self.stats
+    root = Node(self.problem.initial())
+    if self.problem.is_goal(root.state):
+      return root
+    limit = heuristic(root.state)
+    while self.max_depth is None or limit <= self.max_depth:
+      stats.iterations += 1
+      node, nlimit = self._bounded(root, limit, heuristic)
+      if node is not None or nlimit is None or stats.stopped is not None:
+        return node
+      limit = nlimit
+    self._incomplete('max depth')
+    return None
+
+  def _bounded(self, root: Node, limit: int, heuristic) -> tuple:
+    """Return (goal node or None, smallest depth + heuristic above limit or None)"""
+    problem = self.problem
+    stats = self.stats
+    if self._tick(1, 0):
+      return None, None
+    nlimit = None
+    root_key = problem.key(root.state)
+    on_path = {root_key}
+    stack = [(root, root_key, iter(problem.successors(root.state)))]
+    while stack:
+      node, key, children = stack[-1]
+      child = next(children, None)
+      if child is None:
+        stack.pop()
+        on_path.discard(key)
+        continue
+      move, state = child
+      stats.generated += 1
+      nkey = problem.key(state)
+      if nkey in on_path:
+        stats.duplicates += 1
+        continue
+      depth = node.depth + 1
+      f = depth + heuristic(state)
+      if f > limit:
+        if nlimit is None or f < nlimit:
+          nlimit = f
+        continue
+      nnode = Node(state, node, move, depth)
+      if depth > stats.max_depth:
+        stats.max_depth = depth
+      if problem.is_goal(state):
+        return nnode, None
+      if self._tick(len(stack), depth):
+        return None, None
+      on_path.add(nkey)
+      stack.append((nnode, nkey, iter(problem.successors(state))))
+      if len(stack) > stats.max_frontier:
+        stats.max_frontier = len(stack)
+    return None, nlimit
+
+  def astar(self, weight: float=1.0) -> Node:
+    self._begin('astar')
+    return self._end(self._best_first(1, weight))
+
+  def greedy(self) -> Node:
+    self._begin('greedy')
+    return self._end(self._best_first(0, 1))
+
+  def _best_first(self, depth_weight: int, weight: float) -> Node:
+    """States are closed when popped, ties go to the deeper state"""
+    problem = self.problem
+    stats = self.stats
+    visited = self.visited
+    root = Node(problem.initial())
+    counter = 0
+    heap = [(weight * problem.heuristic(root.state), 0, counter, root)]
+    while heap:
+      _, _, _, node = heappop(heap)
+      if not visited.add(problem.key(node.state)):
+        stats.duplicates += 1
+        continue
+      if problem.is_goal(node.state):
+        return node
+      if self.max_depth is not None and node.depth >= self.max_depth:
+        self._incomplete('max depth')
+        continue
+      if self._tick(len(heap), node.depth):
+        return None
+      depth = node.depth + 1
+      if depth > stats.max_depth:
+        stats.max_depth = depth
+      for move, state in problem.successors(node.state):
+        stats.generated += 1
+        if problem.key(state) in visited:
+          stats.duplicates += 1
+          continue
+        counter += 1
+        f = depth_weight * depth + weight * problem.heuristic(state)
+        heappush(heap, (f, -depth, counter, Node(state, node, move, depth)))
+      if len(heap) > stats.max_frontier:
+        stats.max_frontier = len(heap)
+    return None
+
+  def beam(self, beam_width: int=100) -> Node:
+    problem = self.problem
+    stats = self._begin('beam')
+    root = Node(problem.initial())
+    self.visited.add(problem.key(root.state))
+    if problem.is_goal(root.state):
+      return self._end(root)
+    layer = [root]
+    while layer:
+      depth = layer[0].depth + 1
+      if self.max_depth is not None and depth > self.max_depth:
+        self._incomplete('max depth')
+        break
+      children = []
+      for node in layer:
+        if self._tick(len(layer), node.depth):
+          return self._end(None)
+        for move, state in problem.successors(node.state):
+          stats.generated += 1
+          if not self.visited.add(problem.key(state)):
+            stats.duplicates += 1
+            continue
+          child = Node(state, node, move, depth)
+          if problem.is_goal(state):
+            stats.max_depth = depth
+            return self._end(child)
+          children.append((problem.heuristic(state), child))
+      if not children:
+        break
+      stats.max_depth = depth
+      stats.max_frontier = max(stats.max_frontier, len(children))
+      if len(children) > beam_width:
+        self._incomplete('beam width')
+      layer = [child for _, child in nsmallest(beam_width, children, key=itemgetter(0))]
+    return self._end(None)
+
+  def _begin(self, strategy: str) -> Stats:
+    self.stats = Stats(strategy)
+    self.deadline = None
+    self.progress.reset()
+    if self.time_limit is not None:
+      self.deadline = self.stats.start_time + self.time_limit
+    return self.stats
+
+  def _end(self, node: Node, visited: bool=True) -> Node:
+    """visited is False for the strategies which do not use the visited store"""
+    stats = self.stats
+    stats.elapsed = time.time() - stats.start_time
+    if (node is None and visited and stats.duplicates
+        and getattr(self.visited, 'may_skip', False)):
+      self._incomplete('bloom filter')
+    return node
+
+  def _incomplete(self, reason: str):
+    """Note that states were left out, a limit hit by _tick takes precedence"""
+    if self.stats.stopped is None:
+      self.stats.stopped = reason
+
+  def _tick(self, frontier: int, depth: int) -> bool:
+    """Count one expansion, return True when a limit is reached"""
+    stats = self.stats
+    stats.expanded += 1
+    self.progress.update(stats.expanded, frontier, depth)
+    if self.max_nodes is not None and stats.expanded > self.max_nodes:
+      stats.stopped = 'max nodes'
+      return True
+    if (self.deadline is not None and stats.expanded % CLOCK_INTERVAL == 0
+        and time.time() > self.deadline):
+      stats.stopped = 'time limit'
+      return True
+    return False
+
+
+def add_arguments(parser, default: str='bfs'):
+  """Options of the search engine and of Progress, read back by from_args"""
+  group = parser.add_argument_group('search engine')
+  group.add_argument('--strategy', choices=STRATEGIES, default=default)
+  group.add_argument('--visited', choices=STORES, default='set',
+                     help='how repeated states are detected')
+  group.add_argument('--visited-size', type=int, default=1_000_000,
+                     help='entries kept by lru, expected entries of bloom')
+  group.add_argument('--max-nodes', type=int, help='stop after this many expansions')
+  group.add_argument('--time-limit', type=float, help='stop after this many seconds')
+  group.add_argument('--max-depth', type=int, help='do not expand states this deep')
+  group.add_argument('--beam-width', type=int, default=100)
+  group.add_argument('--weight', type=float, default=1.0, help='heuristic weight of astar')
+  add_progress_arguments(parser)
+
+
+def add_progress_arguments(parser):
+  """Options of Progress, read back by progress_from_args"""
+  group = parser.add_argument_group('progress')
+  group.add_argument('--quiet', action='store_true', help='print no progress or statistics')
+  group.add_argument('--verbose', action='store_true',
+                     help='also report every time the search gets deeper')
+  group.add_argument('--progress-interval', type=int, default=1000, metavar='MS',
+                     help='milliseconds between progress lines')
+  group.add_argument('--stats-json', metavar='PATH',
+                     help='write nodes, peak frontier and peak memory as JSON at exit')
+  group = parser.add_argument_group('profiling')
+  group.add_argument('--profile', action='store_true',
+                     help='print calls and time of the solver phases at exit')
+  group.add_argument('--cprofile', metavar='PATH',
+                     help='run under cProfile and write its stats to PATH '
+                          '(python -m pstats PATH)')
+  group.add_argument('--tracemalloc', metavar='PATH',
+                     help='trace allocations, write a snapshot to PATH and '
+                          'print the lines which allocated most')
+
+
+def progress_from_args(args) -> Progress:
+  """The Progress of the command line, made once and kept on args"""
+  progress = getattr(args, 'progress', None)
+  if progress is None:
+    verbosity = 0 if args.quiet else 2 if args.verbose else 1
+    progress = Progress(args.progress_interval, verbosity)
+    args.progress = progress
+    if args.stats_json:
+      atexit.register(progress.dump, args.stats_json)
+  return progress
+
+
+def profile_from_args(args, phases: list=()) -> Profiler:
+  """
+  Start the profiling asked for on the command line, report at exit.
+  phases are (class or module, names) pairs for Profiler.instrument and
+  are only wrapped with --profile, otherwise None is returned.
+  """
+  if args.cprofile:
+    import cProfile
+    profile = cProfile.Profile()
+    atexit.register(profile.dump_stats, args.cprofile)
+    atexit.register(profile.disable)
+    profile.enable()
+  if args.tracemalloc:
+    import tracemalloc
+    tracemalloc.start()
+    atexit.register(_dump_tracemalloc, args.tracemalloc)
+  if not args.profile:
+    return None
+  profiler = Profiler()
+  for target, names in phases:
+    profiler.instrument(target, *names)
+  atexit.register(profiler.report)
+  return profiler
+
+
+def _dump_tracemalloc(path: str, top: int=10):
+  import tracemalloc
+  snapshot = tracemalloc.take_snapshot()
+  snapshot.dump(path)
+  current, peak = tracemalloc.get_traced_memory()
+  print(f'traced memory: {current / 2 ** 20:.1f} MB, peak {peak / 2 ** 20:.1f} MB',
+        file=sys.stderr)
+  for stat in snapshot.statistics('lineno')[:top]:
+    print(stat, file=sys.stderr)
+
+
+def from_args(problem: Problem, args) -> Search:
+  return Search(problem, make_store(args.visited, args.visited_size),
+                args.max_nodes, args.time_limit, args.max_depth, progress_from_args(args))
+
+
+def run_from_args(problem: Problem, args) -> Node:
+  """
+  Run the strategy picked on the command line and print the stats unless
+  quiet. The search is kept on args for no_solution_message.
+  """
+  search = from_args(problem, args)
+  args.search = search
+  options = {}
+  if args.strategy == 'astar':
+    options['weight'] = args.weight
+  elif args.strategy == 'beam':
+    options['beam_width'] = args.beam_width
+  node = search.run(args.strategy, **options)
+  if search.progress.verbosity:
+    search.stats.report()
+  return node
+
+
+def no_solution_message(args) -> str:
+  """What to print when a search of run_from_args found nothing, a limit is not a proof"""
+  search = getattr(args, 'search', None)
+  if search is not None and search.stats.stopped is not None:
+    return f'No solution found, search incomplete: {INCOMPLETE[search.stats.stopped]}'
+  return 'No solution'